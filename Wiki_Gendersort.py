@@ -11,29 +11,48 @@ https://osf.io/preprints/socarxiv/ezw7p/
 
 Use build_dataset() to build the dataset from scratch with Wikiedia searches.
 This should already been done on our own first name database and available
-in NamesOut.txt
+in NamesOut.txt, which is compiled into NamesOut.snap at first use so it can
+be memory-mapped instead of parsed afterwards.
+build_dataset(), name_to_gender() and lectdatalog() are in dataset_build.py,
+and are only imported when used, since they depend on the wikipedia package.
 
 Use wiki_gendersort() class to assign a gender based on the built dataset.
     WG = wiki_gendersort()
     WG.assign('Nicolas')
+    WG.lookup('Nicolas')
     WG.file_assign('test_file.txt')
 """
 
-from os.path import isfile
-from os import remove
-from shutil import copyfile
-from wikipedia import search, summary
-from datetime import datetime
-# from math import floor
-import wikipedia
-import json
-# import sys
 import string
+import sys
+import tempfile
+from array import array
 from bisect import bisect_left
 from unidecode import unidecode
 from pathlib import Path
-from multiprocessing import Pool
-from tqdm import tqdm
+from names_index import (GENDERS, load_names_key, publish_snapshot,
+                         names_nbytes, source_signature)
+from threading import Event, Lock, Thread
+from table_io import (add_columns, add_fields, chunk_column, chunk_writer,
+                      read_chunks, schema_names, table_schema)
+from fuzzy_index import fuzzy_index
+from compressed_io import (open_text, find_compressed, detect_compression,
+                           compression_suffix, strip_compression)
+from collections import OrderedDict, deque, namedtuple
+from heapq import merge
+from itertools import islice
+from time import perf_counter, time
+
+# Functions to build the dataset, imported on first use with
+# Wiki_Gendersort.build_dataset, since they depend on the wikipedia package
+_BUILD_FUNCTIONS = {'lectdatalog', 'name_to_gender', 'build_dataset'}
+
+
+def __getattr__(attr):
+    if attr in _BUILD_FUNCTIONS:
+        import dataset_build
+        return getattr(dataset_build, attr)
+    raise AttributeError("module %r has no attribute %r" % (__name__, attr))
 
 
 def index(a, x):
@@ -68,294 +87,49 @@ def file_len(fname, encod):
     return(i+1)
 
 
+class _char_table(dict):
+    """Character class table, computed with unidecode the first time each
+    character is looked up.
+
+    table[c] is True if unidecode(c) is in the string chars.
+    """
+
+    def __init__(self, chars):
+        self.chars = chars
+        # unidecode leaves ASCII characters unchanged
+        self.update((chr(i), chr(i) in chars) for i in range(128))
+
+    def __missing__(self, c):
+        value = unidecode(c) in self.chars
+        self[c] = value
+        return value
+
+
+class _keep_table(dict):
+    """str.translate() table of nameclean(), keeping the alphabetical
+    characters, periods and hyphens, and replacing the others by spaces.
+    """
+
+    def __missing__(self, i):
+        c = chr(i)
+        value = c if _ALPHA[c] or c in {'.', '-'} else ' '
+        self[i] = value
+        return value
+
+
+_ALPHA = _char_table(string.ascii_lowercase + string.ascii_uppercase)
+_VOWELS = _char_table('aeiouyAEIOUY')
+_KEEP = _keep_table()
+
+
 def countalpha(name):
     "Counts the number of alphabetical characters in a string"
-    i = 0
-    chars = string.ascii_lowercase + string.ascii_uppercase
-    for c in name:
-        if unidecode(c) in chars:
-            i += 1
-    return(i)
+    return(sum(map(_ALPHA.__getitem__, name)))
 
 
 def countvowel(name):
     "Counts the number of vowels in a string"
-    i = 0
-    for c in name:
-        if unidecode(c) in 'aeiouyAEIOUY':
-            i += 1
-    return(i)
-
-
-def lectdatalog(cwd, backup=True):
-    "Cleans and imports data from log file"
-    # Cleans log
-    datalog = []
-    datanames = []
-
-    log_path = cwd / 'NamesLog.txt'
-    if isfile(log_path):
-        # Back-up of current log file
-        nbulog = 1
-        bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
-        while isfile(cwd / bu_name):
-            nbulog += 1
-            bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
-        copyfile(log_path, cwd / bu_name)
-        if backup:
-            print('Copying ' + log_path.name + ' into ' + bu_name)
-
-        print('Importing ' + log_path.stem)
-        with open(log_path) as f:
-            datalogtemp = f.read()
-        datalogtemp = datalogtemp.split('\n\n')
-        for d in datalogtemp:
-            if len(d) != 0:
-                ds = d.split('\n')
-                if len(ds) >= 2:
-                    name = ds[0]
-                    gend = ds[-1].replace(' ', '').split('=')[-1]
-                    try:
-                        time = datetime.strptime(ds[-2],
-                                                 '%Y-%m-%d %H:%M:%S.%f')
-                    except ValueError:
-                        time = datetime.strptime(ds[-2],
-                                                 '%Y-%m-%d %H:%M:%S')
-                    name_idx = bisect_left(datanames, name)
-                    if (name_idx != len(datanames) and
-                            datanames[name_idx] == name):
-                        if datalog[name_idx][2] < time:
-                            datalog[name_idx] = [name, gend, time, d]
-                    else:
-                        datanames.insert(name_idx, name)
-                        datalog.insert(name_idx, [name, gend, time, d])
-        if not backup:
-            remove(bu_name)
-
-    return datalog, datanames
-
-
-def name_to_gender(name):
-    "Assigns gender to a first name based on a wikipedia search"
-
-    log_data = name
-    gender = 'UNK'
-    if len(name) == 0 or len(name.split()) == 0 or name.upper() == 'NULL':
-        gender = 'INI'
-        log_data += '\nname is empty\n'
-        log_data += str(datetime.now()) + '\n'
-        log_data += name + ' = ' + gender
-        return gender, log_data
-
-    elif countalpha(name) <= 1 or countvowel(name) == 0:
-        gender = 'INI'
-        log_data += '\nname is initials\n'
-        log_data += str(datetime.now()) + '\n'
-        log_data += name + ' = ' + gender
-        return gender, log_data
-
-    # genh: # of pages refering to a man. genf: woman.
-    genh = 0
-    genf = 0
-    nam = name
-    # Search parameters if previous search was inconclusive
-    # 0: Presence of a page FIRST_NAME (given name)
-    # 1: FIRST_NAME LAST_NAME
-    # 2: Analysis of page listing (not their content)
-    # 3: LAST_NAME FIRST_NAME
-    ntry = 0
-    while ntry <= 1 and gender == 'UNK':
-        ntry += 1
-    # filtered pages, which are the ones kept from the wikipedia search.
-    # The second list contains added disambiguations, if needed
-        fpag = []
-        fpag2 = []
-        log_data += '\n'+str(ntry)+'\n'
-        try:
-            if ntry == 1:
-                for pag in search(nam, results=1000):
-                    if (pag[:len(nam)+1] == nam+' ' and
-                            pag[len(nam)+1].isupper()):
-                        fpag.append(pag)
-            if ntry == 2:
-                fpag.append(''.join(search(nam, results=1000)))
-        except wikipedia.exceptions.WikipediaException:
-            pass
-        except json.decoder.JSONDecodeError:
-            pass
-    # Pages analysis
-        for pag in fpag:
-            tpag = ''
-            heocc = 0
-            hisocc = 0
-            sheocc = 0
-            herocc = 0
-            if ntry == 1:
-                log_data += pag
-                # If page does not exist of is a disambiguation
-                try:
-                    # The following line if the true code bottleneck
-                    tpag = summary(pag).lower()
-                    log_data += '\n'
-                except wikipedia.exceptions.DisambiguationError as e:
-                    log_data += ' - DISAMBIGUATION\n'
-                    fpag2.append([])
-                    for dpag in e.options:
-                        if (((dpag[:len(nam)+1] == nam+' ' and
-                              dpag[len(nam)+1].isupper() and
-                              ntry == 1) or
-                             (dpag[-len(nam)-1:] == ' '+nam or
-                              ' '+nam+' (' in dpag)) and
-                                dpag not in fpag and
-                                len(fpag2[-1]) < 20):
-                            fpag2[-1].append(dpag)
-                    if len(fpag2[-1]) == 0:
-                        fpag2.pop()
-                    elif fpag2[-1][0] not in fpag:
-                        fpag.insert(fpag.index(pag)+1, fpag2[-1].pop(0))
-                except wikipedia.exceptions.PageError:
-                    pass
-                except wikipedia.exceptions.WikipediaException:
-                    pass
-                except json.decoder.JSONDecodeError:
-                    pass
-            elif ntry == 2:
-                tpag = pag.lower()
-            # Counts the number of 'he', 'his', 'she' and 'her'
-            # (and variants) to identify the gender
-            if len(tpag) != 0:
-                tpag = tpag.replace('\n', ' ')
-                tpag = tpag.replace('(', ' ')
-                tpag = tpag.replace(')', ' ')
-                tpag = tpag.replace(",", ' ')
-                tpag = tpag.replace(".", ' ')
-                tpag = tpag.replace("'", ' ')
-                if ntry == 1:
-                    heocc = tpag.count(' he ')
-                    sheocc = tpag.count(' she ')
-                    hisocc = tpag.count(' his ')
-                    herocc = tpag.count(' her ')
-                    log_data += ('he='+str(heocc) +
-                                 ' his='+str(hisocc) +
-                                 ' she='+str(sheocc) +
-                                 ' her='+str(herocc) +
-                                 '\n')
-                elif ntry == 2:
-                    heocc = tpag.count(' men ')
-                    hisocc = tpag.count(' male ')
-                    sheocc = tpag.count(' women ')
-                    herocc = tpag.count(' female ')
-                    log_data += ('men='+str(heocc) +
-                                 ' male='+str(hisocc) +
-                                 ' women='+str(sheocc) +
-                                 ' female='+str(herocc) +
-                                 '\n')
-                if heocc+hisocc >= 3*(sheocc+herocc) and heocc+hisocc > 0:
-                    genh += 1
-                elif (sheocc+herocc >= 3*(heocc+hisocc) and
-                      sheocc+herocc > 0):
-                    genf += 1
-            # Adding an element of fpag2 if we don't have enough data
-            if (fpag.index(pag) == len(fpag)-1) and (len(fpag2) > 0):
-                if len(fpag2[0]) > 0:
-                    if fpag2[0][0] not in fpag:
-                        fpag.append(fpag2[0].pop(0))
-                if len(fpag2[0]) > 0:
-                    fpag2.append(fpag2[0])
-                if len(fpag2) == 1 and len(fpag2[0]) == 0:
-                    fpag2 = []
-                else:
-                    fpag2 = fpag2[1:]
-            if genh + genf >= 20:
-                break
-            # Unisex if less than 3/4 of occurences are of the same gender
-        if genh >= 3*genf and genh > 0:
-            gender = 'M'
-        if genf >= 3*genh and genf > 0:
-            gender = 'F'
-        if (gender == 'UNK' and (genh != 0 or genf != 0)):
-            gender = 'UNI'
-        if ntry <= 2:
-            log_data += name + ' = %iH %iF\n' % (genh, genf)
-        log_data += str(datetime.now()) + '\n'
-        log_data += name + ' = ' + gender
-
-    return gender, log_data
-
-
-def build_dataset(reboot=False):
-    """Builds the database of gender based on Wikipedia search.
-
-    This code takes a list of first names separated by a line break \n
-    in file Names.txt and constructs a database in NamesOut.txt by assigning
-    them a gender.
-
-    NamesOut.txt will contain the same names, but followed by the
-    assigned gender (both of them being seprated by a tab \t).
-
-    The gender attribution (M, F, UNI, INI or UNK) is done according to the
-    occurrence of first names on Wikipedia pages concerning them.
-    M: male
-    F: female
-    UNI: unisex
-    INI: initials
-    UNK: unknown
-
-    If NamesOut.txt already exists, it will be ignored and overwritten.
-    Information on gender assignment is present in the log file (NamesLog.txt).
-    The log file is automatically detected to launch the code back where it was
-    in the case it got interrupted.
-
-    Set reboot=True if you want to disregard log files and start from scratch
-    """
-
-    cwd = Path(__file__).parent.absolute()
-    inputnames = cwd / 'Names.txt'
-
-    # namestot: List of str names to attribute a gender to
-    namestot_raw = ['']
-    with open(inputnames, 'r') as namefile:
-        namestot_raw = namefile.read().split('\n')
-
-    print('Names sorting')
-    namestot = sorted(list(set(namestot_raw)))
-    print('Log reading')
-    datalog, datanames = lectdatalog(cwd)
-    if index(datanames, '') == -1 or not datanames or reboot:
-        datanames += ['']
-        datalog += [['',
-                     'UNK',
-                     datetime.now(),
-                     '\nname is empty\n' + str(datetime.now()) + '\n = UNK']]
-
-    print('Names treatment')
-    # Keeping only names that are not in log file in namesfil
-    namesfil = []
-    for name in namestot:
-        if index(datanames, name) == -1:
-            namesfil.append(name)
-
-    print('Fetching names data from Wikipedia')
-    # tn = cpu_count()
-    # Since the bottleneck is waiting for the wikipedia server to ping back,
-    # n_pool should be as high as possible
-    n_pool = 25
-    with open(cwd / 'NamesLog.txt', 'w', encoding='utf-8') as filelog:
-        filelog.write('\n\n'.join([d[3] for d in datalog]))
-        with Pool(n_pool) as pool:
-            with tqdm(total=len(namesfil)) as pbar:
-                for gender, log_data in pool.imap_unordered(name_to_gender,
-                                                            namesfil):
-                    pbar.update()
-                    filelog.write('\n\n'+log_data)
-
-    print('Saving out file in NamesOut.txt')
-    datalog, datanames = lectdatalog(cwd, backup=False)
-    gender_data = {k[0]: k[1] for k in datalog}
-    with open(cwd / 'NamesOut.txt', 'w', encoding='utf-8') as fileout:
-        fileout.write('\n'.join([name + '\t' + gender_data[name]
-                                 for name in namestot_raw]))
-    print('Done')
+    return(sum(map(_VOWELS.__getitem__, name)))
 
 
 def nameclean(first_name):
@@ -384,140 +158,981 @@ def nameclean(first_name):
 
     # Separates the string in sequences with anything not a letter or a
     # period acting as delimiter
-    namf = ''
-    for i in name:
-        if countalpha(i) >= 1 or i in {'.', '-'}:
-            namf += i
-        else:
-            namf += ' '
-    namf = [n for n in namf.split() if countalpha(n) != 0]
+    namf = [n for n in name.translate(_KEEP).split() if n.strip('.-')]
 
     # Separates fused strings and gets rid of periods at the end of strings,
     # separating them if capitalization suggests it (AliM. -> Ali M),
     # and puts the strings that ended with a period as the end of the sequence
+    # namf is used as a queue: the strings put at the end are treated again
+    namc = []
     j = 0
     while j < len(namf):
-        if (len(namf[j]) >= 4 and
-                namf[j][-1] == '.' and
-                namf[j][-2].isupper() and
-                namf[j][-3].islower()):
-            namf.insert(j+1, namf[j][-2:])
-            namf[j] = namf[j][:-2]
-        if namf[j][-1] == '.' and 4 > len(namf[j]) > 1:
-            namf.append(namf[j][:-1])
-            del namf[j]
-            j -= 1
-        j += 1
-
-    # Resplit any period that remains (A.Carl -> A Carl)
-    j = 0
-    while j < len(namf):
-        if '.' in namf[j]:
-            namsplit = namf[j].split('.')[::-1]
-            for n in namsplit:
-                namf.insert(j + 1, n)
-            del namf[j]
-            j += len(namsplit)-1
-        j += 1
-
-    # Hyphens will duplicate the sequence and its components:
-    # "John-Paul" -> ["John-Paul", "John", "Paul"]
-    j = 0
-    while j < len(namf):
-        # namf[j] = '-'.join([n for n in namf[j].split('-') if n])
-        while namf[j] and namf[j][0] == '-':
-            namf[j] = namf[j][1:]
-        while namf[j] and namf[j][-1] == '-':
-            namf[j] = namf[j][:-1]
-        if '-' in namf[j]:
-            for n in namf[j].split('-')[::-1]:
-                namf.insert(j + 1, n)
+        nam = namf[j]
+        if (len(nam) >= 4 and
+                nam[-1] == '.' and
+                nam[-2].isupper() and
+                nam[-3].islower()):
+            namc.append(nam[:-2])
+            namf.append(nam[-2])
+        elif nam[-1] == '.' and 4 > len(nam) > 1:
+            namf.append(nam[:-1])
+        else:
+            namc.append(nam)
         j += 1
 
-    # Takes the strings that are not initials (if 1 letter or no vowels)
-    # and duplicates any string not corresponding to unidecode characters
     namf2 = []
-    for nam in namf:
-        if countalpha(nam) > 1 and countvowel(nam) > 0:
-            if len(nam) <= 1:
-                n = nam.upper()
-            else:
-                n = nam[0].upper()+nam[1:].lower()
-            namf2.append(n)
-            un = unidecode(n)
-            if n != un:
-                namf2.append(un)
+    for nam in namc:
+        # Resplit any period that remains (A.Carl -> A Carl)
+        for namp in nam.split('.'):
+            # Hyphens will duplicate the sequence and its components:
+            # "John-Paul" -> ["John-Paul", "John", "Paul"]
+            namp = namp.strip('-')
+            namh = [namp]
+            if '-' in namp:
+                namh += namp.split('-')
+            # Takes the strings that are not initials (if 1 letter or no
+            # vowels) and duplicates any string not corresponding to
+            # unidecode characters.
+            # All the characters left are alphabetical, except hyphens.
+            for n in namh:
+                if (len(n) - n.count('-') > 1 and
+                        any(map(_VOWELS.__getitem__, n))):
+                    n = n[0].upper()+n[1:].lower()
+                    namf2.append(n)
+                    if not n.isascii():
+                        un = unidecode(n)
+                        if n != un:
+                            namf2.append(un)
     return namf2
 
 
+gender_result = namedtuple('gender_result',
+                           ['gender', 'matched_name', 'unknown', 'fuzzy'],
+                           defaults=(False,))
+gender_result.__doc__ = """Result of wiki_gendersort.lookup()
+
+gender: str
+    The gender assigned to the first name (M, F, UNI, UNK or INI).
+
+matched_name: str or None
+    The name token used to assign the gender.
+
+unknown: tuple of str
+    The name tokens that are not in the names database.
+
+fuzzy: bool
+    True if the gender was assigned by an approximate match of an unknown
+    name token (see fuzzy_distance of wiki_gendersort).
+"""
+
+
+batch_result = namedtuple('batch_result',
+                          ['genders', 'matched', 'labels', 'tokens',
+                           'unknown', 'fuzzy'])
+batch_result.__doc__ = """Result of wiki_gendersort.assign_many()
+
+genders: array of uint8
+    Gender code of each first name, in the input order.
+
+matched: array of int32
+    Index in tokens of the matched name token of each first name,
+    or -1 if no name token was matched.
+
+labels: list of str
+    The gender labels, indexed by gender code (M, F, UNI, UNK, INI).
+
+tokens: list of str
+    The matched name tokens.
+
+unknown: set of str
+    The name tokens that are not in the names database.
+
+fuzzy: array of uint8
+    1 for the first names whose gender was assigned by an approximate
+    match, 0 otherwise.
+"""
+
+
+class bounded_cache():
+    """Thread-safe mapping keeping at most maxsize entries, evicting the
+    least recently used entries when full.
+
+    If maxbytes is specified, the entries are also evicted to keep the sum of
+    sizeof(key, value) under maxbytes.
+
+    The numbers of hits, misses and evictions are counted to help choosing
+    maxsize, and returned by stats().
+    """
+
+    def __init__(self, maxsize, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        "Returns the value of key, or default if it is not in the cache"
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        "Adds an entry, evicting the least recently used ones if full"
+        with self._lock:
+            if self.maxbytes is not None:
+                if key in self._data:
+                    self.nbytes -= self.sizeof(key, self._data[key])
+                self.nbytes += self.sizeof(key, value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while (len(self._data) > self.maxsize or
+                   (self.maxbytes is not None and
+                    self.nbytes > self.maxbytes and self._data)):
+                old_key, old_value = self._data.popitem(last=False)
+                if self.maxbytes is not None:
+                    self.nbytes -= self.sizeof(old_key, old_value)
+                self.evictions += 1
+
+    def clear(self):
+        "Removes all the entries, keeping the statistics"
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        "Returns the size and the hits, misses and evictions of the cache"
+        lookups = self.hits + self.misses
+        stats = {'size': len(self._data),
+                 'maxsize': self.maxsize,
+                 'hits': self.hits,
+                 'misses': self.misses,
+                 'evictions': self.evictions,
+                 'hit_rate': self.hits/lookups if lookups else 0.}
+        if self.maxbytes is not None:
+            stats['nbytes'] = self.nbytes
+            stats['maxbytes'] = self.maxbytes
+        return stats
+
+
+def _result_nbytes(name, result):
+    "Approximate memory of an entry of the cache of assign() results"
+    matched_name = result.matched_name
+    unknown_set = result.unknown
+    nbytes = (sys.getsizeof(name) + sys.getsizeof(result) +
+              sys.getsizeof(unknown_set) + sum(map(sys.getsizeof,
+                                                    unknown_set)))
+    if matched_name is not None:
+        nbytes += sys.getsizeof(matched_name)
+    # Entry of the OrderedDict and its linked list
+    return nbytes + 100
+
+
+class unknown_tokens():
+    """Set of the unknown name tokens found by file_assign(), written in
+    a file sorted and deduplicated.
+
+    When more than max_size tokens are held in memory, they are written as
+    a sorted run in a temporary file of the folder temp_dir, and the runs
+    are merged when writing the final file.
+    """
+
+    def __init__(self, max_size=10**6, temp_dir=None):
+        self.max_size = max_size
+        self.temp_dir = temp_dir
+        self.tokens = set()
+        self.runs = []
+
+    def update(self, tokens):
+        "Adds name tokens to the set"
+        self.tokens.update(tokens)
+        if len(self.tokens) > self.max_size:
+            self._spill()
+
+    def _spill(self):
+        "Writes the tokens in memory as a sorted run on disk"
+        run = tempfile.TemporaryFile('w+', encoding='utf-8',
+                                     dir=self.temp_dir)
+        run.writelines(token + '\n' for token in sorted(self.tokens))
+        run.seek(0)
+        self.runs.append(run)
+        self.tokens = set()
+
+    def __iter__(self):
+        "Iterates over the distinct tokens, sorted"
+        if not self.runs:
+            yield from sorted(self.tokens)
+            return
+        runs = [(line[:-1] for line in run) for run in self.runs]
+        previous = None
+        for token in merge(sorted(self.tokens), *runs):
+            if token != previous:
+                yield token
+                previous = token
+
+    def write(self, path):
+        """Writes the sorted tokens in a file, separated by line breaks.
+        The file is not created if there are no tokens.
+
+        Returns
+        -------
+        int
+            The number of distinct tokens
+        """
+        n_tokens = 0
+        tokens = iter(self)
+        for token in tokens:
+            with open_text(path, 'w') as newfile:
+                newfile.write(token)
+                n_tokens = 1
+                for token in tokens:
+                    newfile.write('\n' + token)
+                    n_tokens += 1
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        return n_tokens
+
+
 class wiki_gendersort():
     def __init__(self,
                  input_path=None,
-                 verbose=False):
+                 verbose=False,
+                 snapshot=True,
+                 backend='dict',
+                 nameclean_cache_size=0,
+                 result_cache_size=0,
+                 result_cache_bytes=None,
+                 fuzzy_distance=0):
+        """Imports the names database.
+
+        Parameters
+        ----------
+        input_path: str, optional
+            path to the names database, either a NamesOut.txt file (which
+            can be compressed, like NamesOut.txt.gz) or its compiled .snap
+            snapshot. If None, NamesOut.txt in the folder of this file is
+            used. Default is None.
+
+        verbose: bool, optional
+            Prints the imported file. Default is False.
+
+        snapshot: bool, optional
+            If True, the binary snapshot next to input_path (NamesOut.snap)
+            is used instead of parsing the text file when it is up to date,
+            and is regenerated when the text file changed.
+            Default is True.
+
+        backend: str, optional
+            Storage of the names database in names_key.
+            'dict' stores it in a dict, which has the fastest lookups.
+            'compact' stores it in a names_table of sorted arrays, which
+            uses a fraction of the memory with slower lookups, and is shared
+            between processes through the memory-mapped snapshot.
+            Both give the same genders.
+            Default is 'dict'.
+
+        nameclean_cache_size: int, optional
+            Maximum number of raw first names whose nameclean() tokens are
+            kept in memory by assign(), which is useful when the same first
+            names are assigned many times. The cache statistics are given
+            by cache_info(). 0 disables the cache.
+            Default is 0.
+
+        result_cache_size: int, optional
+            Maximum number of raw first names whose gender, matched name
+            and unknown tokens are kept in memory by assign(), so that
+            assigning the same first name again is a single dict lookup.
+            The cache is emptied when the names database is reloaded, and
+            its statistics are given by cache_info(). 0 disables the cache.
+            Default is 0.
+
+        result_cache_bytes: int, optional
+            Maximum memory used by the cache of assign() results, in bytes,
+            in addition to result_cache_size. If None, only the number of
+            entries is limited. Default is None.
+
+        fuzzy_distance: int, optional
+            If above 0, when no name token of a first name has a gender in
+            the names database, its unknown tokens are matched to the
+            closest name with the gender M, F or UNI within fuzzy_distance
+            edits (insertions, deletions, substitutions or transpositions),
+            and the result is flagged as fuzzy. The index of fuzzy_index.py
+            is built at the first approximate lookup, which takes a few
+            seconds. 0 disables approximate matches. Default is 0.
+        """
         if input_path is None:
             cwd = Path(__file__).parent.absolute()
-            self.input_path = cwd / 'NamesOut.txt'
+            self.input_path = find_compressed(cwd / 'NamesOut.txt')
         else:
             self.input_path = Path(input_path)
 
-        if verbose:
-            print('Importing names database from ' + self.input_path.name)
-        self.names_key = {}
-        with open(self.input_path, 'r', encoding='utf-8') as filewg:
-            for line in filewg.readlines():
-                ls = line.replace('\n', '').split('\t')
-                name = '\t'.join(ls[0:-1]).upper()
-                if name[0]:
-                    name = name[0] + name[1:].lower()
-                gend = ls[-1]
-                self.names_key[name] = gend
+        self.snapshot = snapshot
+        self.backend = backend
+        self.verbose = verbose
+        self.reload_stats = None
+        self._watcher = None
+        self._source = source_signature(self.input_path)
+        self.nameclean_cache = None
+        self.nameclean_cache_size = nameclean_cache_size
+        if nameclean_cache_size > 0:
+            self.nameclean_cache = bounded_cache(nameclean_cache_size)
+        self.names_key = load_names_key(self.input_path,
+                                        snapshot=snapshot,
+                                        verbose=verbose,
+                                        backend=backend)
+        self.result_cache_size = result_cache_size
+        self.result_cache_bytes = result_cache_bytes
+        self._new_result_cache()
+        self.fuzzy_distance = fuzzy_distance
+        self._fuzzy_index = None
+        self._fuzzy_lock = Lock()
 
-    def assign(self,
+    @classmethod
+    def attach(cls,
+               name,
+               verbose=False):
+        """Uses a names database published by another process with
+        publish(), without copying or parsing it.
+
+        The names database is memory-mapped in the 'compact' backend, so all
+        the processes attached to it share the same memory. This is meant
+        for worker processes, for instance:
+            WG = wiki_gendersort()
+            name = WG.publish()
+            with Pool(8, initializer=init_worker, initargs=(name,)) as pool:
+                ...
+        where init_worker() sets a global to wiki_gendersort.attach(name).
+
+        Parameters
+        ----------
+        name: str or Path
+            The value returned by publish().
+
+        verbose: bool, optional
+            Prints the imported file. Default is False.
+        """
+        return cls(input_path=name, verbose=verbose, backend='compact')
+
+    def publish(self,
+                path=None):
+        """Publishes the names database in shared memory so that other
+        processes can use it with wiki_gendersort.attach().
+
+        The published file is removed by unpublish(), which can be called
+        as soon as all the processes are attached.
+
+        Parameters
+        ----------
+        path: str, optional
+            Path of the published names database. If None, a new file is
+            created in /dev/shm, or in the temporary folder if /dev/shm does
+            not exist. Default is None.
+
+        Returns
+        -------
+        str
+            The name to give to wiki_gendersort.attach()
+        """
+        self.published_path = publish_snapshot(self.names_key, path)
+        return str(self.published_path)
+
+    def unpublish(self):
+        "Removes the names database published with publish()"
+        published_path = getattr(self, 'published_path', None)
+        if published_path is not None:
+            published_path.unlink(missing_ok=True)
+            self.published_path = None
+
+    def reload(self,
+               force=False):
+        """Imports the names database again if its file was modified.
+
+        The new names database is fully imported before replacing names_key
+        in a single assignment, so assign() calls running in other threads
+        keep using the previous one until they return, and never see a
+        partially imported names database.
+
+        The duration of the reload and the memory used by both names
+        databases, which coexist during the reload, are kept in the
+        reload_stats dict.
+
+        Parameters
+        ----------
+        force: bool, optional
+            Imports the names database even if its file was not modified.
+            Default is False.
+
+        Returns
+        -------
+        bool
+            True if the names database was reloaded.
+        """
+        source = source_signature(self.input_path)
+        if source is None or (source == self._source and not force):
+            return False
+        t0 = perf_counter()
+        names_key = load_names_key(self.input_path,
+                                   snapshot=self.snapshot,
+                                   verbose=self.verbose,
+                                   backend=self.backend)
+        latency = perf_counter() - t0
+        old_nbytes = names_nbytes(self.names_key)
+        new_nbytes = names_nbytes(names_key)
+        self.names_key = names_key
+        self._source = source
+        self._new_result_cache()
+        self.reload_stats = {'time': time(),
+                             'latency': latency,
+                             'old_nbytes': old_nbytes,
+                             'new_nbytes': new_nbytes,
+                             'overlap_nbytes': old_nbytes + new_nbytes}
+        if self.verbose:
+            print('Names database reloaded in %.3f s (%.1f MB during swap)' %
+                  (latency, (old_nbytes + new_nbytes)/2**20))
+        return True
+
+    def watch(self,
+              interval=10.):
+        """Reloads the names database in a background thread whenever its
+        file is modified, until stop_watch() is called.
+
+        Parameters
+        ----------
+        interval: float, optional
+            Number of seconds between checks of the file. Default is 10.
+        """
+        if self._watcher is not None:
+            return
+        stop = Event()
+
+        def watcher():
+            previous = self._source
+            while not stop.wait(interval):
+                # Waits for the file to be unchanged for one interval, so
+                # that a file being written is not imported
+                source = source_signature(self.input_path)
+                if source != previous:
+                    previous = source
+                    continue
+                try:
+                    self.reload()
+                except (OSError, ValueError) as e:
+                    # The file is being rewritten; tried again next time
+                    if self.verbose:
+                        print('Names database reload failed: ' + str(e))
+
+        self._watcher = (Thread(target=watcher, daemon=True), stop)
+        self._watcher[0].start()
+
+    def stop_watch(self):
+        "Stops the background thread started by watch()"
+        if self._watcher is not None:
+            thread, stop = self._watcher
+            stop.set()
+            thread.join()
+            self._watcher = None
+
+    def _nameclean(self,
+                   name):
+        "nameclean() through the cache of the instance, if enabled"
+        cache = self.nameclean_cache
+        if cache is None:
+            return nameclean(name)
+        namelist = cache.get(name)
+        if namelist is None:
+            # Stored as a tuple so that no caller can modify a cached value
+            namelist = tuple(nameclean(name))
+            cache.put(name, namelist)
+        return namelist
+
+    def fuzzy_index(self,
+                    names_key=None):
+        """Returns the fuzzy_index of the names database, built on first use
+        and again after a reload"""
+        if names_key is None:
+            names_key = self.names_key
+        index = self._fuzzy_index
+        if index is None or index[0] is not names_key:
+            with self._fuzzy_lock:
+                index = self._fuzzy_index
+                if index is None or index[0] is not names_key:
+                    index = (names_key,
+                             fuzzy_index(names_key, self.fuzzy_distance))
+                    self._fuzzy_index = index
+        return index[1]
+
+    def cache_info(self):
+        "Returns the statistics of the caches of the instance"
+        info = {}
+        if self.nameclean_cache is not None:
+            info['nameclean'] = self.nameclean_cache.stats()
+        if self._result_cache is not None:
+            info['result'] = self._result_cache[1].stats()
+        return info
+
+    def _new_result_cache(self):
+        """Empties the cache of assign() results, which is tied to the
+        current names_key so that results of a previous names database are
+        never returned after reload()"""
+        self._result_cache = None
+        if self.result_cache_size > 0:
+            self._result_cache = (self.names_key,
+                                  bounded_cache(self.result_cache_size,
+                                                self.result_cache_bytes,
+                                                _result_nbytes))
+
+    def lookup(self,
                name):
-        "Assign a gender to a first name (string)"
-        self.unknown_set = []
-        self.matched_name = None
-        namelist = nameclean(name)
+        """Assigns a gender to a first name (string) without modifying the
+        instance, so that it can be called from several threads at once.
+
+        Returns
+        -------
+        gender_result
+            Named tuple with the gender, the matched name token (or None),
+            the tuple of the name tokens that are not in the names database,
+            and whether the gender comes from an approximate match.
+        """
+        # names_key may be replaced by reload() in another thread
+        names_key = self.names_key
+        result_cache = self._result_cache
+        if result_cache is not None:
+            if result_cache[0] is names_key:
+                result = result_cache[1].get(name)
+                if result is not None:
+                    return result
+            else:
+                # Cache of a previous names database during a reload
+                result_cache = None
+
+        unknown_set = []
+        matched_name = None
+        namelist = self._nameclean(name)
         gend = 'UNK'
         for nam in namelist:
-            if nam in self.names_key:
-                new_gend = self.names_key[nam]
+            new_gend = names_key.get(nam)
+            if new_gend is not None:
                 if new_gend != 'UNK':
-                    if not self.matched_name:
-                        self.matched_name = nam
+                    if not matched_name:
+                        matched_name = nam
                     gend = new_gend
             else:
-                self.unknown_set.append(nam)
+                unknown_set.append(nam)
             if gend not in {'UNK', 'UNI'}:
-                self.matched_name = nam
+                matched_name = nam
                 break
+        fuzzy = False
+        if gend == 'UNK' and unknown_set and self.fuzzy_distance > 0:
+            index = self.fuzzy_index(names_key)
+            for nam in unknown_set:
+                match = index.find(nam)
+                if match is not None:
+                    matched_name, gend, _ = match
+                    fuzzy = True
+                    break
         if not namelist and name:
             gend = 'INI'
         if name.upper() == 'NULL':
             gend = 'UNK'
+            fuzzy = False
+
+        result = gender_result(gend, matched_name, tuple(unknown_set), fuzzy)
+        if result_cache is not None:
+            result_cache[1].put(name, result)
+        return result
+
+    def assign(self,
+               name):
+        """Assign a gender to a first name (string)
+
+        The matched name token, the unknown name tokens and whether the
+        gender comes from an approximate match are kept in the matched_name,
+        unknown_set and fuzzy attributes. Use lookup() instead when the
+        instance is shared between threads.
+        """
+        result = self.lookup(name)
+        self.matched_name = result.matched_name
+        self.unknown_set = list(result.unknown)
+        self.fuzzy = result.fuzzy
+        return result.gender
 
-        return gend
+    def assign_many(self,
+                    names):
+        """Assigns a gender to many first names at once.
+
+        The first names are deduplicated first, so that nameclean() and the
+        names database lookup are done once per distinct first name, and
+        the results are returned as compact arrays instead of strings.
+
+        Parameters
+        ----------
+        names: iterable of str
+            The first names.
+
+        Returns
+        -------
+        batch_result
+            Named tuple with the arrays of gender codes and of matched
+            token indices in the order of the input, the gender labels
+            of the codes, the matched tokens, the set of unknown tokens and
+            the array of approximate match flags.
+        """
+        if not isinstance(names, (list, tuple)):
+            names = list(names)
+        labels = list(GENDERS)
+        label_codes = {g: i for i, g in enumerate(labels)}
+        tokens = []
+        token_idx = {None: -1}
+        unknown = set()
+        # Distinct first names mapped to their gender code, then to the
+        # index of their matched token
+        gend_code = dict.fromkeys(names)
+        match_code = {}
+        fuzzy_names = set()
+        for name in gend_code:
+            gend, matched_name, unknown_set, fuzzy = self.lookup(name)
+            if fuzzy:
+                fuzzy_names.add(name)
+            if gend not in label_codes:
+                label_codes[gend] = len(labels)
+                labels.append(gend)
+            if matched_name not in token_idx:
+                token_idx[matched_name] = len(tokens)
+                tokens.append(matched_name)
+            gend_code[name] = label_codes[gend]
+            match_code[name] = token_idx[matched_name]
+            unknown.update(unknown_set)
+        if fuzzy_names:
+            fuzzy_code = dict.fromkeys(gend_code, 0)
+            fuzzy_code.update(dict.fromkeys(fuzzy_names, 1))
+            fuzzy_flags = array('B', map(fuzzy_code.__getitem__, names))
+        else:
+            # Without approximate matches, as with fuzzy_distance=0
+            fuzzy_flags = array('B', bytes(len(names)))
+        return batch_result(array('B', map(gend_code.__getitem__, names)),
+                            array('i', map(match_code.__getitem__, names)),
+                            labels,
+                            tokens,
+                            unknown,
+                            fuzzy_flags)
+
+    def assign_column(self,
+                      values,
+                      chunksize=10**6):
+        """Assigns a gender to a column of first names of a pandas or
+        Arrow table.
+
+        The column is processed in chunks of chunksize rows. The first names
+        of each chunk are deduplicated with categorical codes (or Arrow
+        dictionary encoding) and assigned with assign_many(), so no Python
+        object is created per row. Missing values are assigned 'UNK'.
+
+        Parameters
+        ----------
+        values: pandas.Series, pyarrow.Array or pyarrow.ChunkedArray
+            The first names. Categorical Series are assigned from their
+            categories without chunking.
+
+        chunksize: int, optional
+            Number of rows processed at once, which bounds the memory used
+            in addition to the output. Default is 1000000.
+
+        Returns
+        -------
+        pandas.DataFrame or pyarrow.Table
+            Table of the same type as values, with the categorical columns
+            'gender' and 'matched_name' (null if no name token was matched),
+            and the same index for a pandas Series.
+        """
+        import numpy as np
+
+        labels = list(GENDERS)
+        label_codes = {g: i for i, g in enumerate(labels)}
+        tokens = []
+        token_idx = {}
+
+        def distinct_codes(uniques):
+            """Returns the global gender and matched token codes of
+            distinct first names, followed by the codes of a missing value
+            so that the index -1 of missing values selects them"""
+            batch = self.assign_many(uniques)
+            for label in batch.labels:
+                if label not in label_codes:
+                    label_codes[label] = len(labels)
+                    labels.append(label)
+            for token in batch.tokens:
+                if token not in token_idx:
+                    token_idx[token] = len(tokens)
+                    tokens.append(token)
+            glabels = np.array([label_codes[g] for g in batch.labels] +
+                               [label_codes['UNK']], dtype=np.int8)
+            gtokens = np.array([token_idx[t] for t in batch.tokens] + [-1],
+                               dtype=np.int32)
+            gend = np.append(np.asarray(batch.genders, dtype=np.intp),
+                             len(batch.labels))
+            matched = np.append(np.asarray(batch.matched, dtype=np.intp),
+                                -1)
+            return glabels[gend], gtokens[matched]
+
+        if type(values).__module__.split('.')[0] == 'pyarrow':
+            import pyarrow as pa
+            import pyarrow.compute as pc
+
+            if isinstance(values, pa.Array):
+                values = pa.chunked_array([values])
+            gend_chunks = []
+            matched_chunks = []
+            for array_chunk in values.chunks:
+                for start in range(0, len(array_chunk), chunksize):
+                    encoded = array_chunk.slice(start, chunksize)
+                    if not pa.types.is_dictionary(encoded.type):
+                        encoded = encoded.dictionary_encode()
+                    gend, matched = distinct_codes(
+                        encoded.dictionary.to_pylist())
+                    codes = pc.fill_null(encoded.indices, -1).to_numpy()
+                    gend_chunks.append(gend[codes])
+                    matched_chunks.append(matched[codes])
+            label_array = pa.array(labels)
+            token_array = pa.array(tokens, type=pa.string())
+            return pa.table({
+                'gender': pa.chunked_array(
+                    [pa.DictionaryArray.from_arrays(g, label_array)
+                     for g in gend_chunks],
+                    type=pa.dictionary(pa.int8(), pa.string())),
+                'matched_name': pa.chunked_array(
+                    [pa.DictionaryArray.from_arrays(
+                        pa.array(m, mask=m < 0), token_array)
+                     for m in matched_chunks],
+                    type=pa.dictionary(pa.int32(), pa.string()))})
+
+        import pandas as pd
+
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            gend, matched = distinct_codes(list(values.cat.categories))
+            codes = values.cat.codes.to_numpy()
+            gend = gend[codes]
+            matched = matched[codes]
+        else:
+            gend = np.empty(len(values), dtype=np.int8)
+            matched = np.empty(len(values), dtype=np.int32)
+            for start in range(0, len(values), chunksize):
+                codes, uniques = pd.factorize(
+                    values.iloc[start:start+chunksize])
+                gend_chunk, matched_chunk = distinct_codes(list(uniques))
+                gend[start:start+chunksize] = gend_chunk[codes]
+                matched[start:start+chunksize] = matched_chunk[codes]
+        return pd.DataFrame(
+            {'gender': pd.Categorical.from_codes(gend, labels),
+             'matched_name': pd.Categorical.from_codes(matched, tokens)},
+            index=values.index)
+
+    def _assign_lines(self,
+                      names,
+                      newnames):
+        """Returns the output lines of file_assign() for a list of names,
+        adding their unknown name tokens to newnames"""
+        result = self.assign_many(names)
+        labels = result.labels
+        newnames.update(result.unknown)
+        return ''.join([name + '\t' + labels[gend] + '\n'
+                        for name, gend in zip(names, result.genders)])
+
+    def _parallel_file_assign(self,
+                              input_path,
+                              output_path,
+                              newnames,
+                              batch_size,
+                              workers,
+                              chunk_size,
+                              compression):
+        "file_assign() with a pool of processes"
+
+        def tasks():
+            "Chunks of the file, ending at line breaks"
+            if compression is None:
+                # Read by the processes themselves
+                size = input_path.stat().st_size
+                start = 0
+                with open(input_path, 'rb') as infile:
+                    while start < size:
+                        infile.seek(start + chunk_size)
+                        infile.readline()
+                        end = min(infile.tell(), size)
+                        yield input_path, start, end, None, batch_size
+                        start = end
+            else:
+                # Decompressed here, and sent to the processes
+                with open_text(input_path, compression=compression,
+                               prefetch=True) as infile:
+                    while True:
+                        names = [line.replace('\n', '')
+                                 for line in infile.readlines(chunk_size)]
+                        if not names:
+                            break
+                        yield None, 0, 0, names, batch_size
+
+        with open_text(output_path, 'w') as outfile:
+            for _, (lines, unknown) in self._worker_imap(_assign_file_chunk,
+                                                         tasks(), workers):
+                outfile.write(lines)
+                newnames.update(unknown)
+
+    def _worker_imap(self,
+                     function,
+                     tasks,
+                     workers):
+        """Yields (task, function(task)) for each task, in order, computed by
+        a pool of workers processes attached to the names database, where
+        function can use the global _file_worker.
+
+        The names database is published in a file of its own, so that a
+        database published by the caller with publish() is left as is."""
+        from multiprocessing import Pool
+
+        shared_path = publish_snapshot(self.names_key, None)
+        try:
+            with Pool(workers,
+                      initializer=_init_file_worker,
+                      initargs=(str(shared_path),
+                                self.nameclean_cache_size,
+                                self.result_cache_size or 10**5,
+                                self.fuzzy_distance)) as pool:
+                # At most 2 tasks per process are in memory
+                pending = deque()
+                for task in tasks:
+                    pending.append((task, pool.apply_async(function,
+                                                           (task,))))
+                    if len(pending) >= 2*workers:
+                        task, result = pending.popleft()
+                        yield task, result.get()
+                while pending:
+                    task, result = pending.popleft()
+                    yield task, result.get()
+        finally:
+            shared_path.unlink(missing_ok=True)
+
+    def table_assign(self,
+                     input_path,
+                     column,
+                     output_path=None,
+                     chunksize=100000,
+                     delimiter=None):
+        """Assigns a gender to a column of first names of a CSV or Parquet
+        table, adding the columns gender, matched_name and unknown.
+
+        The table is read, assigned and written in chunks of chunksize rows,
+        so the memory used does not depend on its size. Each chunk is
+        deduplicated before assigning genders.
+
+        Parameters
+        ----------
+        input_path: str or Path
+            Path of the table. Files with the extension .parquet or .pq are
+            read as Parquet (which needs the pyarrow package), and the other
+            ones as CSV files with a header line, which can be compressed.
+
+        column: str
+            Name of the column of first names.
+
+        output_path: str or Path, optional
+            Path of the output table, written as Parquet or CSV depending
+            on its extension. The unknown column contains the unknown name
+            tokens separated by spaces, and matched_name is empty if no name
+            token was matched. With fuzzy_distance above 0, a fuzzy column
+            is added, 1 for approximate matches and 0 otherwise. If None,
+            the path will be input_path with '_output' added to its name.
+            Default is None.
+
+        chunksize: int, optional
+            Number of rows processed at once. Default is 100000.
+
+        delimiter: str, optional
+            Delimiter of the CSV files. If None, it is a tab for .tsv files
+            and a comma otherwise. Default is None.
+        """
+        input_path = Path(input_path).absolute()
+        if output_path is None:
+            base_path = strip_compression(input_path)
+            output_path = base_path.parent / (base_path.stem + '_output' +
+                                              base_path.suffix +
+                                              compression_suffix(input_path))
+        print('Assigning gender to the names in table ' + input_path.name)
+        schema = table_schema(input_path, delimiter)
+        fields = {'gender': 'str', 'matched_name': 'str', 'unknown': 'str'}
+        if self.fuzzy_distance > 0:
+            fields['fuzzy'] = 'int'
+        if column not in schema_names(schema):
+            raise KeyError('Column %s not in table %s' %
+                           (column, input_path.name))
+        for new_column in fields:
+            if new_column in schema_names(schema):
+                raise ValueError('Table %s already has a column %s' %
+                                 (input_path.name, new_column))
+        output_schema = add_fields(schema, fields)
+        n_rows = 0
+        with chunk_writer(output_path, output_schema, delimiter) as writer:
+            for chunk in read_chunks(input_path, chunksize, delimiter):
+                names = ['' if name is None else str(name)
+                         for name in chunk_column(chunk, column)]
+                results = {name: self.lookup(name)
+                           for name in dict.fromkeys(names)}
+                results = [results[name] for name in names]
+                columns = {'gender': [r.gender for r in results],
+                           'matched_name': [r.matched_name or ''
+                                            for r in results],
+                           'unknown': [' '.join(r.unknown) for r in results]}
+                if self.fuzzy_distance > 0:
+                    columns['fuzzy'] = [int(r.fuzzy) for r in results]
+                writer.write(add_columns(chunk, columns, output_schema))
+                n_rows += len(names)
+        print('Genders of %i rows assigned in table %s' %
+              (n_rows, Path(output_path).name))
 
     def file_assign(self,
                     input_path,
                     output_path=None,
-                    unknown_path=None):
+                    unknown_path=None,
+                    batch_size=10000,
+                    max_unknown=10**6,
+                    workers=1,
+                    chunk_size=2**24):
         """Assigns a gender to a list of first names in a file.
 
+        The file is streamed, so files larger than the memory can be
+        assigned.
+
         Parameters
         ----------
         input_path: str
             path to the file containing names to assign a gender.
             The names should be separated by a line break in a .txt file
-            encoded in utf-8.
+            encoded in utf-8, which can be compressed with gzip, bz2, xz or
+            zstd (detected from the content of the file).
 
         output_path: str, optional
             path to the file containing the genders of the names.
             Each entry will be separated by a line break \n, and the gender
             will be separated from the name by a tab \t, encoded in utf-8.
 
-            If None, the path will be input_path+'_genders.txt'.
-            Default is None.
+            If None, the path will be input_path+'_output.txt', compressed
+            like input_path. The file is compressed if its extension is .gz,
+            .bz2, .xz or .zst. Default is None.
 
         unknown_path: str, optional
             path to the file containing names that were not in the database
@@ -528,42 +1143,114 @@ class wiki_gendersort():
             Alternatively, the unknown names could be manually assigned to a
             gender with name_to_gender().
 
-            If None, the path will be input_path+'_unknown.txt'.
-            Default is None.
+            If None, the path will be input_path+'_unknown.txt', compressed
+            like input_path. The file is compressed if its extension is .gz,
+            .bz2, .xz or .zst. Default is None.
+
+        batch_size: int, optional
+            Number of lines read, assigned and written at once.
+            Default is 10000.
+
+        max_unknown: int, optional
+            Maximum number of unknown names kept in memory. Above it, they
+            are written in sorted temporary files that are merged at the end.
+            Default is 1000000.
+
+        workers: int, optional
+            Number of processes assigning the genders. Above 1, the file is
+            split in chunks of about chunk_size bytes, ending at line breaks,
+            which are assigned in parallel by processes attached to the
+            names database with publish(). The output is written in the
+            order of the input file. Since the processes use the slower
+            'compact' backend, they keep a cache of 100000 assign() results
+            if result_cache_size is 0. Default is 1.
+
+        chunk_size: int, optional
+            Size of the chunks of the file given to each process, in bytes,
+            when workers is above 1. Default is 16 MB.
         """
         input_path = Path(input_path).absolute()
         print('Assigning gender to the names in file ' + input_path.name)
+        # Outputs are compressed like the input by default
+        base_path = strip_compression(input_path)
+        suffix = compression_suffix(input_path)
         if output_path is None:
-            output_path = input_path.parent / (input_path.stem+'_output.txt')
+            output_path = base_path.parent / (base_path.stem + '_output.txt' +
+                                              suffix)
         if unknown_path is None:
-            unknown_path = input_path.parent / (input_path.stem+'_unknown.txt')
-        infile = open(input_path, 'r', encoding='utf-8')
-        outfile = open(output_path, 'w', encoding='utf-8')
-        newnames = []
-        for line in infile.readlines():
-            name = line.replace('\n', '')
-            gend = self.assign(name)
-            for newname in self.unknown_set:
-                nind = bisect_left(newnames, newname)
-                if nind == len(newnames) or newnames[nind] != newname:
-                    newnames.insert(nind, newname)
-            outfile.write(line.replace('\n', '') + '\t' + gend + '\n')
-        infile.close()
-        outfile.close()
+            unknown_path = base_path.parent / (base_path.stem +
+                                               '_unknown.txt' + suffix)
+        output_path = Path(output_path)
+        unknown_path = Path(unknown_path)
+        newnames = unknown_tokens(max_unknown, unknown_path.parent)
+        compression = detect_compression(input_path)
+        if workers > 1:
+            self._parallel_file_assign(input_path, output_path, newnames,
+                                       batch_size, workers, chunk_size,
+                                       compression)
+        else:
+            # Compressed files are decompressed in a background thread
+            with open_text(input_path, compression=compression,
+                           prefetch=compression is not None) as infile, \
+                    open_text(output_path, 'w') as outfile:
+                # The file is read, assigned and written batch_size lines
+                # at a time, so the memory used does not depend on its size
+                while True:
+                    names = [line.replace('\n', '')
+                             for line in islice(infile, batch_size)]
+                    if not names:
+                        break
+                    outfile.write(self._assign_lines(names, newnames))
         print('Genders assigned in file ' + output_path.name)
-        if len(newnames) != 0:
-            with open(unknown_path, 'w', encoding='utf-8') as newfile:
-                newfile.write('\n'.join(newnames))
-            print('%i unknown names identified in file ' % len(newnames) +
+        n_newnames = newnames.write(unknown_path)
+        if n_newnames != 0:
+            print('%i unknown names identified in file ' % n_newnames +
                   unknown_path.name)
             print('Consider adding those names to Names.txt and ' +
                   'running build_dataset()')
 
 
+# wiki_gendersort of the processes of file_assign(workers=N)
+_file_worker = None
+
+
+def _init_file_worker(shared_name, nameclean_cache_size, result_cache_size,
+                      fuzzy_distance=0):
+    "Attaches a file_assign() process to the published names database"
+    global _file_worker
+    _file_worker = wiki_gendersort(input_path=shared_name,
+                                   backend='compact',
+                                   nameclean_cache_size=nameclean_cache_size,
+                                   result_cache_size=result_cache_size,
+                                   fuzzy_distance=fuzzy_distance)
+
+
+def _assign_file_chunk(task):
+    """Assigns the names of the lines between the bytes start and end of a
+    file, or of a list of names, returning the output lines and the set of
+    unknown name tokens"""
+    input_path, start, end, names, batch_size = task
+    if names is None:
+        with open(input_path, 'rb') as infile:
+            infile.seek(start)
+            text = infile.read(end - start).decode('utf-8')
+        # Same line breaks as reading the file in text mode
+        names = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        if names[-1] == '':
+            names.pop()
+    newnames = set()
+    lines = [_file_worker._assign_lines(names[i:i+batch_size], newnames)
+             for i in range(0, len(names), batch_size)]
+    return ''.join(lines), newnames
+
+
 if __name__ == '__main__':
     # build_dataset()
 
     # WG = wiki_gendersort()
     # WG.assign('Nicolas')
     # WG.file_assign('test_file.txt')
-    pass
+
+    # Command line interface, like python Wiki_Gendersort.py assign names.txt
+    from gendersort_cli import main
+    sys.exit(main())
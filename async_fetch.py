@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+asyncio fetch engine of build_dataset(engine='async').
+
+name_to_gender() waits on the Wikipedia API most of the time, which
+build_dataset() hides with a pool of 25 processes. This engine runs the
+same classification, name_to_gender_steps() of dataset_build.py, for
+hundreds of names at once in a single process: each name is a coroutine
+sending the search() and summary() requests of the wikipedia package to the
+MediaWiki API over a pool of keep-alive HTTP connections.
+
+mediawiki_client reproduces the requests of the wikipedia package: search()
+is the same list=search query, and summary() the same auto-suggest search,
+page info query (following redirects, with the disambiguation pages
+raising DisambiguationError with the links of the page) and extract query.
+The responses of the API raise the same exceptions as the wikipedia
+package, so that the classification and its log are the same with both
+engines.
+
+Only the standard library is used, with the BeautifulSoup dependency of the
+wikipedia package for the disambiguation pages. The API URL can be changed,
+for example for another language or for a local stand-in server.
+"""
+
+import asyncio
+import gzip
+import json
+import queue
+import ssl
+import zlib
+from threading import Thread
+from urllib.parse import urlencode, urlsplit
+from bs4 import BeautifulSoup
+from wikipedia.exceptions import (DisambiguationError, HTTPTimeoutError,
+                                  PageError, WikipediaException)
+from dataset_build import name_to_gender_steps
+
+API_URL = 'https://en.wikipedia.org/w/api.php'
+USER_AGENT = ('Wiki-Gendersort '
+              '(https://github.com/nicolasberube/Wiki-Gendersort)')
+
+# Statuses of overloaded or rate limited servers, for which requests are
+# retried
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class fetch_error(Exception):
+    "Exception raised when a request fails after all its retries"
+
+
+class _connection():
+    "Keep-alive HTTP/1.1 connection"
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    async def read_response(self):
+        """Reads a response and returns its status, headers (dict with
+        lowercase keys) and decoded body"""
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the server')
+        version, status = status_line.decode('latin-1').split()[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and
+                                     connection != 'keep-alive'):
+            self.reusable = False
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers
+                    while (await self.reader.readline()) not in \
+                            (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(
+                int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            self.reusable = False
+
+        encoding = headers.get('content-encoding', '').lower()
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+        return int(status), headers, body
+
+    def close(self):
+        self.writer.close()
+
+
+class http_pool():
+    """Pool of keep-alive HTTP/1.1 connections to the server of a URL, for
+    asyncio.
+
+    Parameters
+    ----------
+    url: str
+        URL of the server (http or https).
+
+    connections: int, optional
+        Maximum number of open connections. The requests wait for a free
+        connection above this number. Default is 64.
+
+    timeout: float, optional
+        Timeout of a request, in seconds. Default is 30.
+
+    headers: dict, optional
+        Headers sent with every request. Default is None.
+    """
+
+    def __init__(self, url, connections=64, timeout=30, headers=None):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.https = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self.headers = {'Host': parts.netloc,
+                        'Accept-Encoding': 'gzip',
+                        'Connection': 'keep-alive'}
+        self.headers.update(headers or {})
+        self._ssl = ssl.create_default_context() if self.https else None
+        self._idle = []
+        self._slots = asyncio.Semaphore(connections)
+        self.n_opened = 0
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port,
+                                                       ssl=self._ssl)
+        self.n_opened += 1
+        return _connection(reader, writer)
+
+    async def get(self, params):
+        """GET request of the URL with the query params.
+
+        Returns
+        -------
+        tuple
+            (status, headers, body) of the response.
+        """
+        request = ('GET %s?%s HTTP/1.1\r\n' % (self.path, urlencode(params)) +
+                   ''.join('%s: %s\r\n' % item
+                           for item in self.headers.items()) +
+                   '\r\n').encode('utf-8')
+        async with self._slots:
+            while True:
+                # An idle connection may have been closed by the server:
+                # the request is sent again on a new connection
+                reused = bool(self._idle)
+                conn = self._idle.pop() if reused else await self._open()
+                try:
+                    conn.writer.write(request)
+                    response = await asyncio.wait_for(conn.read_response(),
+                                                      self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                if conn.reusable:
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                return response
+
+    async def close(self):
+        "Closes the idle connections"
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+
+
+def disambiguation_options(html):
+    """Titles linked by a disambiguation page, like the options of the
+    DisambiguationError of the wikipedia package"""
+    lis = BeautifulSoup(html, 'html.parser').find_all('li')
+    filtered_lis = [li for li in lis
+                    if 'tocsection' not in ''.join(li.get('class', []))]
+    return [li.a.get_text() for li in filtered_lis if li.a]
+
+
+class mediawiki_client():
+    """search() and summary() of the wikipedia package as coroutines.
+
+    Parameters
+    ----------
+    api_url: str, optional
+        URL of the MediaWiki API. Default is the English Wikipedia.
+
+    connections: int, optional
+        Maximum number of open connections. Default is 64.
+
+    timeout: float, optional
+        Timeout of a request, in seconds. Default is 30.
+
+    retries: int, optional
+        Number of times a request is retried after a connection error, a
+        timeout or a status 429 or 5xx, waiting 1, 2, 4... seconds (or the
+        Retry-After of the response) in between. Default is 5.
+
+    user_agent: str, optional
+        User-Agent header of the requests.
+    """
+
+    def __init__(self,
+                 api_url=API_URL,
+                 connections=64,
+                 timeout=30,
+                 retries=5,
+                 user_agent=USER_AGENT):
+        self.pool = http_pool(api_url, connections, timeout,
+                              {'User-Agent': user_agent})
+        self.retries = retries
+        self.n_requests = 0
+
+    async def request(self, params):
+        "Query of the API, returning its decoded JSON response"
+        params = dict(params, format='json')
+        params.setdefault('action', 'query')
+        for attempt in range(self.retries + 1):
+            delay = 2**attempt
+            try:
+                status, headers, body = await self.pool.get(params)
+            except (OSError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError) as e:
+                error = e
+            else:
+                self.n_requests += 1
+                if status not in _RETRY_STATUSES:
+                    # Decoding errors are raised like by the wikipedia
+                    # package (json.decoder.JSONDecodeError)
+                    return json.loads(body)
+                error = fetch_error('HTTP status %i' % status)
+                if headers.get('retry-after', '').isdigit():
+                    delay = int(headers['retry-after'])
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        raise fetch_error('Request %r failed: %r' % (params, error))
+
+    async def search(self, query, results=10, suggestion=False):
+        "Same as wikipedia.search()"
+        params = {'list': 'search',
+                  'srprop': '',
+                  'srlimit': results,
+                  'limit': results,
+                  'srsearch': query}
+        if suggestion:
+            params['srinfo'] = 'suggestion'
+        raw_results = await self.request(params)
+        if 'error' in raw_results:
+            if raw_results['error']['info'] in ('HTTP request timed out.',
+                                                'Pool queue is full'):
+                raise HTTPTimeoutError(query)
+            raise WikipediaException(raw_results['error']['info'])
+        search_results = [d['title'] for d in raw_results['query']['search']]
+        if suggestion:
+            searchinfo = raw_results['query'].get('searchinfo')
+            return search_results, (searchinfo['suggestion'] if searchinfo
+                                    else None)
+        return search_results
+
+    async def _page(self, title):
+        """pageid and title of a page, following redirects, like
+        wikipedia.page(title, auto_suggest=False)"""
+        while True:
+            request = await self.request({'prop': 'info|pageprops',
+                                          'inprop': 'url',
+                                          'ppprop': 'disambiguation',
+                                          'redirects': '',
+                                          'titles': title})
+            query = request['query']
+            pageid = list(query['pages'].keys())[0]
+            page = query['pages'][pageid]
+            if 'missing' in page:
+                raise PageError(title)
+            elif 'redirects' in query:
+                title = query['redirects'][0]['to']
+            elif 'pageprops' in page:
+                request = await self.request({'prop': 'revisions',
+                                              'rvprop': 'content',
+                                              'rvparse': '',
+                                              'rvlimit': 1,
+                                              'titles': title})
+                html = request['query']['pages'][pageid]['revisions'][0]['*']
+                raise DisambiguationError(title, disambiguation_options(html))
+            else:
+                return pageid, page['title']
+
+    async def summary(self, title):
+        "Same as wikipedia.summary(title)"
+        results, suggestion = await self.search(title, results=1,
+                                                suggestion=True)
+        try:
+            title = suggestion or results[0]
+        except IndexError:
+            # if there is no suggestion or search results, the page doesn't
+            # exist
+            raise PageError(title)
+        pageid, title = await self._page(title)
+        request = await self.request({'prop': 'extracts',
+                                      'explaintext': '',
+                                      'titles': title,
+                                      'exintro': ''})
+        return request['query']['pages'][pageid]['extract']
+
+    async def close(self):
+        await self.pool.close()
+
+
+async def name_to_gender_async(name, client):
+    "name_to_gender() with the requests sent by a mediawiki_client"
+    steps = name_to_gender_steps(name)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                if request[0] == 'search':
+                    result = await client.search(request[1], results=1000)
+                else:
+                    result = await client.summary(request[1])
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+_DONE = object()
+
+
+class async_engine():
+    """Runs name_to_gender() on many names at once with asyncio, in a
+    background thread.
+
+    Parameters
+    ----------
+    api_url: str, optional
+        URL of the MediaWiki API. Default is the English Wikipedia.
+
+    concurrency: int, optional
+        Number of names processed at once. Default is 256.
+
+    connections, timeout, retries, user_agent: optional
+        Parameters of the mediawiki_client.
+
+    Attributes
+    ----------
+    failed: list
+        (name, exception) of the names whose requests failed (after all
+        their retries). They are not returned by imap_unordered().
+
+    n_requests: int
+        Number of requests sent by the last imap_unordered().
+    """
+
+    def __init__(self,
+                 api_url=API_URL,
+                 concurrency=256,
+                 connections=64,
+                 timeout=30,
+                 retries=5,
+                 user_agent=USER_AGENT):
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.client_args = (connections, timeout, retries, user_agent)
+        self.failed = []
+        self.n_requests = 0
+        self._loop = None
+
+    async def _fetch_all(self, names, put):
+        "Processes the names with concurrency coroutines"
+        client = mediawiki_client(self.api_url, *self.client_args)
+        names = iter(names)
+
+        async def worker():
+            for name in names:
+                try:
+                    result = await name_to_gender_async(name, client)
+                except Exception as e:
+                    self.failed.append((name, e))
+                else:
+                    put(result)
+
+        try:
+            await asyncio.gather(*[worker()
+                                   for _ in range(self.concurrency)])
+        finally:
+            self.n_requests = client.n_requests
+            await client.close()
+
+    def imap_unordered(self, names):
+        """Yields the (gender, log_data) of name_to_gender() for the names,
+        in the order they are completed, like Pool.imap_unordered()"""
+        results = queue.Queue()
+        self.failed = []
+        loop = self._loop = asyncio.new_event_loop()
+
+        def run():
+            try:
+                loop.run_until_complete(self._fetch_all(names, results.put))
+            except asyncio.CancelledError:
+                pass
+            except BaseException as e:
+                results.put(e)
+            finally:
+                loop.close()
+                results.put(_DONE)
+
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            if thread.is_alive():
+                self._cancel(loop)
+            thread.join()
+
+    @staticmethod
+    def _cancel(loop):
+        "Cancels the tasks of the loop of imap_unordered()"
+        def cancel():
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+        try:
+            loop.call_soon_threadsafe(cancel)
+        except RuntimeError:
+            # The loop is already closed
+            pass
+
+    def close(self):
+        "Stops the names being processed"
+        if self._loop is not None:
+            self._cancel(self._loop)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
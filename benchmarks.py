@@ -0,0 +1,1301 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Benchmarks of the Wiki-Gendersort library.
+
+Each bench_ function runs one benchmark on the NamesOut.txt database (or on
+the file given as input_path) and prints its results in the console.
+"""
+
+import string
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+from unidecode import unidecode
+from Wiki_Gendersort import nameclean
+
+cwd = Path(__file__).parent.absolute()
+
+
+def _run_python(code):
+    "Runs Python code in a new interpreter and returns its printed output"
+    return subprocess.run([sys.executable, '-c', code],
+                          cwd=cwd,
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout
+
+
+def _countalpha_reference(name):
+    "countalpha() before the character tables, for check_nameclean()"
+    i = 0
+    chars = string.ascii_lowercase + string.ascii_uppercase
+    for c in name:
+        if unidecode(c) in chars:
+            i += 1
+    return(i)
+
+
+def _countvowel_reference(name):
+    "countvowel() before the character tables, for check_nameclean()"
+    i = 0
+    for c in name:
+        if unidecode(c) in 'aeiouyAEIOUY':
+            i += 1
+    return(i)
+
+
+def _nameclean_reference(first_name):
+    """nameclean() as it was before the single pass tokenizer, used by
+    check_nameclean() as the reference output.
+    """
+
+    name = first_name
+    # Puts words in quotations and parenthesis at the end of the string
+    while True:
+        left_i = -1
+        right_i = -1
+        if ('"' in name and name.find('"') != name.rfind('"')):
+            left_i = name.find('"')
+            right_i = left_i + 1 + name[left_i+1:].find('"')
+        if ('(' in name and ')' in name and
+                name.find('(') < name.rfind(')')):
+            left_i = name.find('(')
+            right_i = name.rfind(')')
+        if left_i != -1 and right_i != -1:
+            name = (name[:left_i] + ' ' +
+                    name[right_i+1:] + ' ' +
+                    name[left_i+1:right_i])
+        else:
+            break
+
+    # Separates the string in sequences with anything not a letter or a
+    # period acting as delimiter
+    namf = ''
+    for i in name:
+        if _countalpha_reference(i) >= 1 or i in {'.', '-'}:
+            namf += i
+        else:
+            namf += ' '
+    namf = [n for n in namf.split() if _countalpha_reference(n) != 0]
+
+    # Separates fused strings and gets rid of periods at the end of strings,
+    # separating them if capitalization suggests it (AliM. -> Ali M),
+    # and puts the strings that ended with a period as the end of the sequence
+    j = 0
+    while j < len(namf):
+        if (len(namf[j]) >= 4 and
+                namf[j][-1] == '.' and
+                namf[j][-2].isupper() and
+                namf[j][-3].islower()):
+            namf.insert(j+1, namf[j][-2:])
+            namf[j] = namf[j][:-2]
+        if namf[j][-1] == '.' and 4 > len(namf[j]) > 1:
+            namf.append(namf[j][:-1])
+            del namf[j]
+            j -= 1
+        j += 1
+
+    # Resplit any period that remains (A.Carl -> A Carl)
+    j = 0
+    while j < len(namf):
+        if '.' in namf[j]:
+            namsplit = namf[j].split('.')[::-1]
+            for n in namsplit:
+                namf.insert(j + 1, n)
+            del namf[j]
+            j += len(namsplit)-1
+        j += 1
+
+    # Hyphens will duplicate the sequence and its components:
+    # "John-Paul" -> ["John-Paul", "John", "Paul"]
+    j = 0
+    while j < len(namf):
+        # namf[j] = '-'.join([n for n in namf[j].split('-') if n])
+        while namf[j] and namf[j][0] == '-':
+            namf[j] = namf[j][1:]
+        while namf[j] and namf[j][-1] == '-':
+            namf[j] = namf[j][:-1]
+        if '-' in namf[j]:
+            for n in namf[j].split('-')[::-1]:
+                namf.insert(j + 1, n)
+        j += 1
+
+    # Takes the strings that are not initials (if 1 letter or no vowels)
+    # and duplicates any string not corresponding to unidecode characters
+    namf2 = []
+    for nam in namf:
+        if _countalpha_reference(nam) > 1 and _countvowel_reference(nam) > 0:
+            if len(nam) <= 1:
+                n = nam.upper()
+            else:
+                n = nam[0].upper()+nam[1:].lower()
+            namf2.append(n)
+            un = unidecode(n)
+            if n != un:
+                namf2.append(un)
+    return namf2
+
+
+def _names_lines(input_path):
+    "Returns the raw names of a names database text file"
+    with open(input_path, 'r', encoding='utf-8') as f:
+        return ['\t'.join(line.replace('\n', '').split('\t')[:-1])
+                for line in f]
+
+
+def check_nameclean(input_path=None):
+    """Checks that nameclean() gives exactly the same tokens as the
+    previous implementation for every name of the names database, both as
+    written in the file and lowercased.
+
+    Returns
+    -------
+    list
+        The names for which the outputs differ (empty if all is fine).
+    """
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = _names_lines(input_path)
+    names += [name.lower() for name in names]
+    print('Checking nameclean() on %i names' % len(names))
+    errors = [name for name in names
+              if nameclean(name) != _nameclean_reference(name)]
+    print('%i differences' % len(errors))
+    print()
+    return errors
+
+
+def bench_nameclean(input_path=None):
+    "Compares the speed of nameclean() with the previous implementation"
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = _names_lines(input_path)
+    print('nameclean() speed on %i names' % len(names))
+    for label, func in [('previous', _nameclean_reference),
+                        ('current', nameclean)]:
+        t0 = perf_counter()
+        for name in names:
+            func(name)
+        t = perf_counter() - t0
+        print('%-10s|%10.2f us/name' % (label, 10**6*t/len(names)))
+    print()
+
+
+def check_threads(input_path=None, n_threads=16, n_names=20000,
+                  n_reloads=5):
+    """Calls lookup() on one shared wiki_gendersort instance from many
+    threads at once, while the names database is reloaded, and checks that
+    every result is the same as when computed in a single thread.
+
+    Returns
+    -------
+    int
+        The number of wrong results (0 if all is fine).
+    """
+    import random
+    from threading import Thread
+    from Wiki_Gendersort import wiki_gendersort
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = _names_lines(input_path)
+    random.seed(0)
+    names = [random.choice(names) for _ in range(n_names)]
+    WG = wiki_gendersort(input_path, nameclean_cache_size=1000,
+                         result_cache_size=1000)
+    expected = {name: WG.lookup(name) for name in names}
+    print('Looking up %i names in %i threads' % (n_names, n_threads))
+    errors = []
+
+    def worker(seed):
+        order = names[:]
+        random.Random(seed).shuffle(order)
+        for name in order:
+            if WG.lookup(name) != expected[name]:
+                errors.append(name)
+
+    threads = [Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    t0 = perf_counter()
+    for thread in threads:
+        thread.start()
+    for _ in range(n_reloads):
+        WG.reload(force=True)
+    for thread in threads:
+        thread.join()
+    t = perf_counter() - t0
+    print('%i wrong results, %.0f lookups/s' %
+          (len(errors), n_threads*n_names/t))
+    print()
+    return len(errors)
+
+
+def skewed_names(input_path=None, n_names=10**6, a=1.2, seed=0):
+    """Returns a list of first names drawn from the names database with a
+    Zipf distribution of exponent a, where a few first names are very
+    frequent like in author lists."""
+    import random
+    from itertools import accumulate
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = _names_lines(input_path)
+    random.seed(seed)
+    random.shuffle(names)
+    weights = list(accumulate(1/(k+1)**a for k in range(len(names))))
+    return random.choices(names, cum_weights=weights, k=n_names)
+
+
+def bench_assign_many(input_path=None, n_names=10**6):
+    """Compares the throughput of assign_many() with a loop of assign() on
+    first names with a skewed distribution"""
+    from Wiki_Gendersort import wiki_gendersort
+
+    names = skewed_names(input_path, n_names)
+    WG = wiki_gendersort(input_path)
+    print('Assigning %i first names (%i distinct)' %
+          (len(names), len(set(names))))
+    t0 = perf_counter()
+    genders = [WG.assign(name) for name in names]
+    t1 = perf_counter()
+    result = WG.assign_many(names)
+    t2 = perf_counter()
+    assert genders == [result.labels[g] for g in result.genders]
+    print('%-15s|%12.0f names/s' % ('assign()', len(names)/(t1-t0)))
+    print('%-15s|%12.0f names/s' % ('assign_many()', len(names)/(t2-t1)))
+    try:
+        import pandas as pd
+    except ImportError:
+        pass
+    else:
+        column = pd.Series(names)
+        t0 = perf_counter()
+        WG.assign_column(column)
+        t1 = perf_counter()
+        print('%-15s|%12.0f names/s' % ('assign_column()',
+                                         len(names)/(t1-t0)))
+    print()
+
+
+def make_names_file(path, size_mb, input_path=None):
+    """Writes a file of first names with a skewed distribution of about
+    size_mb megabytes, to benchmark file assignment"""
+    names = skewed_names(input_path, 10**6)
+    block = '\n'.join(names) + '\n'
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(max(1, round(size_mb * 2**20 / len(block.encode())))):
+            f.write(block)
+    return Path(path)
+
+
+def bench_file_assign(input_path=None, size_mb=2048, temp_dir=None):
+    """Measures the throughput and the peak memory of file_assign() on a
+    names file of size_mb megabytes (2 GB by default), which is written in
+    temp_dir (the temporary folder by default) and removed afterwards."""
+    import tempfile
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    with tempfile.TemporaryDirectory(dir=temp_dir) as folder:
+        names_path = make_names_file(Path(folder) / 'names.txt', size_mb,
+                                     input_path)
+        size = names_path.stat().st_size
+        code = f'''
+import resource
+from time import perf_counter
+from Wiki_Gendersort import wiki_gendersort
+WG = wiki_gendersort({str(input_path)!r})
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = perf_counter()
+WG.file_assign({str(names_path)!r})
+t = perf_counter() - t0
+print(t, rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+        t, rss0, rss1 = _run_python(code).split('\n')[-2].split()
+    print('file_assign() on a %.0f MB file' % (size/2**20))
+    print('%.1f s, %.1f MB/s' % (float(t), size/2**20/float(t)))
+    print('Peak memory: %.0f MB (%.0f MB after importing the database)' %
+          (int(rss1)/2**10, int(rss0)/2**10))
+    print()
+
+
+def bench_file_assign_scaling(input_path=None, size_mb=256, workers=None,
+                              temp_dir=None):
+    """Measures the scaling of file_assign(workers=N) on a names file of
+    size_mb megabytes.
+
+    Parameters
+    ----------
+    workers: list of int, optional
+        Numbers of processes to compare. Default is the powers of 2 up to
+        the number of CPUs.
+    """
+    import os
+    import tempfile
+    from Wiki_Gendersort import wiki_gendersort
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    if workers is None:
+        workers = [2**i for i in range(os.cpu_count().bit_length())]
+    WG = wiki_gendersort(input_path)
+    with tempfile.TemporaryDirectory(dir=temp_dir) as folder:
+        names_path = make_names_file(Path(folder) / 'names.txt', size_mb,
+                                     input_path)
+        size = names_path.stat().st_size
+        print('file_assign() on a %.0f MB file' % (size/2**20))
+        print('%8s|%10s |%10s |%11s ' % ('workers', 'time (s)', 'speedup',
+                                         'efficiency'))
+        t1 = None
+        for n in workers:
+            t0 = perf_counter()
+            WG.file_assign(names_path, workers=n)
+            t = perf_counter() - t0
+            if t1 is None:
+                t1 = t*workers[0]
+            print('%8i|%10.1f |%10.2f |%10.0f %% ' %
+                  (n, t, t1/t, 100*t1/t/n))
+    print()
+
+
+def bench_memory(input_path=None, n_lookups=100000):
+    """Compares the memory used by the 'dict' and 'compact' backends of
+    wiki_gendersort, and the speed of their lookups.
+
+    Each backend is imported in a new process, so that the measures are not
+    affected by each other. The heap size is measured with tracemalloc, and
+    does not include the memory-mapped snapshot which is shared between
+    processes.
+
+    Parameters
+    ----------
+    input_path: str or Path, optional
+        Path to the names database. Default is NamesOut.txt.
+
+    n_lookups: int, optional
+        Number of names to look up to measure the lookup speed.
+        Default is 100000.
+    """
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    print('Memory of the names database ' + Path(input_path).name)
+    print('%-22s|%12s |%12s |%12s ' % ('backend', 'heap (MB)',
+                                       'load (s)', 'lookup (us)'))
+    for backend, snapshot in [('dict', False),
+                              ('dict', True),
+                              ('compact', False),
+                              ('compact', True)]:
+        code = f'''
+import tracemalloc
+from time import perf_counter
+from Wiki_Gendersort import wiki_gendersort
+from names_index import compile_snapshot
+if {snapshot}:
+    compile_snapshot({str(input_path)!r})
+tracemalloc.start()
+t0 = perf_counter()
+WG = wiki_gendersort({str(input_path)!r},
+                     snapshot={snapshot},
+                     backend={backend!r})
+t1 = perf_counter()
+heap = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+names = list(WG.names_key)[::max(1, len(WG.names_key)//{n_lookups})]
+t2 = perf_counter()
+for name in names:
+    WG.names_key.get(name)
+t3 = perf_counter()
+print(heap, t1-t0, (t3-t2)/len(names))
+'''
+        heap, load, lookup = _run_python(code).split()
+        print('%-22s|%12.1f |%12.3f |%12.2f ' %
+              (backend + (' (snapshot)' if snapshot else ' (text)'),
+               int(heap)/2**20, float(load), 10**6*float(lookup)))
+    print()
+
+
+def bench_import_time(n_runs=5):
+    """Measures the time to import Wiki_Gendersort for gender assignment,
+    and with the functions to build the dataset (which import wikipedia,
+    multiprocessing and tqdm).
+
+    Each import is done in a new interpreter, and the best of n_runs
+    is printed.
+    """
+    print('Import time')
+    for label, statement in [
+            ('lookup only', 'import Wiki_Gendersort'),
+            ('with dataset building', 'import Wiki_Gendersort\n'
+                                      'Wiki_Gendersort.build_dataset')]:
+        code = f'''
+from time import perf_counter
+t0 = perf_counter()
+{statement}
+print(perf_counter()-t0)
+'''
+        best = min(float(_run_python(code)) for _ in range(n_runs))
+        print('%-22s|%10.1f ms' % (label, 1000*best))
+    print()
+
+
+def bench_cli(input_path=None, size_mb=256, n_runs=5, temp_dir=None):
+    """Measures the startup time of the wiki-gendersort assign command (the
+    best of n_runs on an empty input) for each --snapshot option, and its
+    throughput in lines per second on a names file of size_mb megabytes
+    piped on its standard input, written in temp_dir (the temporary folder
+    by default) and removed afterwards."""
+    import tempfile
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    command = [sys.executable, str(cwd / 'gendersort_cli.py'), 'assign',
+               '--database', str(input_path)]
+    # Compiles the snapshot beforehand
+    subprocess.run(command, input=b'', check=True)
+    print('Command line startup time')
+    for snapshot in ['on', 'compact', 'off']:
+        times = []
+        for _ in range(n_runs):
+            t0 = perf_counter()
+            subprocess.run(command + ['--snapshot', snapshot], input=b'',
+                           check=True)
+            times.append(perf_counter() - t0)
+        print('--snapshot %-8s|%10.1f ms' % (snapshot, 1000*min(times)))
+    print()
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as folder:
+        names_path = make_names_file(Path(folder) / 'names.txt', size_mb,
+                                     input_path)
+        with open(names_path, 'rb') as f:
+            n_lines = sum(block.count(b'\n')
+                          for block in iter(lambda: f.read(2**20), b''))
+        print('Command line throughput, %i MB' % size_mb)
+        for snapshot in ['on', 'compact']:
+            with open(names_path, 'rb') as infile:
+                t0 = perf_counter()
+                subprocess.run(command + ['--snapshot', snapshot],
+                               stdin=infile,
+                               stdout=subprocess.DEVNULL,
+                               check=True)
+                total = perf_counter() - t0
+            print('--snapshot %-8s|%10.2f s |%12.0f lines/s' %
+                  (snapshot, total, n_lines / total))
+    print()
+
+
+def bench_server(input_path=None, n_clients=16, n_requests=20000,
+                 windows=(0, 0.001), batch_size=100):
+    """Load test of the HTTP server of gendersort_server.py on localhost.
+
+    For each batching window, the server is started in a new process, and
+    n_clients threads send n_requests GET /assign requests in total on
+    keep-alive connections, with skewed first names. The latency
+    percentiles and the requests per second are printed, followed by the
+    same test with POST /assign_many requests of batch_size names.
+    """
+    import http.client
+    import json
+    from threading import Thread
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = skewed_names(input_path, n_requests * batch_size // 10 + 1000)
+
+    def client(port, requests, latencies):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        for method, url, body in requests:
+            t0 = perf_counter()
+            connection.request(method, url, body)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(perf_counter() - t0)
+            if response.status != 200:
+                raise RuntimeError('HTTP status %i' % response.status)
+        connection.close()
+
+    def load_test(port, requests):
+        latencies = []
+        threads = [Thread(target=client,
+                          args=(port, requests[i::n_clients], latencies))
+                   for i in range(n_clients)]
+        t0 = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = perf_counter() - t0
+        latencies.sort()
+        return (1000*latencies[len(latencies)//2],
+                1000*latencies[int(len(latencies)*0.99)],
+                len(latencies) / total)
+
+    from urllib.parse import quote
+    single = [('GET', '/assign?name=' + quote(name), None)
+              for name in names[:n_requests]]
+    n_batches = max(1, n_requests // 10)
+    batches = [('POST', '/assign_many',
+                json.dumps(names[i*batch_size:(i+1)*batch_size]))
+               for i in range(n_batches)]
+
+    print('HTTP server, %i clients' % n_clients)
+    print('%-28s|%10s |%10s |%10s' % ('', 'p50 ms', 'p99 ms', 'req/s'))
+    for window in windows:
+        server = subprocess.Popen([sys.executable,
+                                   str(cwd / 'gendersort_cli.py'), 'serve',
+                                   '--port', '0',
+                                   '--window', str(window),
+                                   '--database', str(input_path)],
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(':', 1)[1])
+            for label, requests in [('GET /assign', single),
+                                    ('POST /assign_many x%i' % batch_size,
+                                     batches)]:
+                p50, p99, rps = load_test(port, requests)
+                print('%-28s|%10.2f |%10.2f |%10.0f' %
+                      (f'{label}, window {window:g}', p50, p99, rps))
+        finally:
+            server.terminate()
+            server.wait()
+    print()
+
+
+def bench_sqlite(input_path=None, n_names=10**6):
+    """Compares the assignment of the genders of a table of n_names skewed
+    first names in an in-memory SQLite database, by reading the rows,
+    assigning them in Python and writing them back, and with a single
+    UPDATE using the assign() SQL function of names_sqlite.py."""
+    import sqlite3
+    from Wiki_Gendersort import wiki_gendersort
+    from names_sqlite import register_functions
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names = skewed_names(input_path, n_names)
+    WG = wiki_gendersort(input_path, result_cache_size=10**5)
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE authors (id INTEGER PRIMARY KEY,'
+                       ' first_name TEXT, gender TEXT)')
+    connection.executemany('INSERT INTO authors (first_name) VALUES (?)',
+                           zip(names))
+    register_functions(connection, WG)
+
+    print('SQLite assignment, %i rows' % n_names)
+    t0 = perf_counter()
+    rows = connection.execute('SELECT id, first_name FROM authors').fetchall()
+    with connection:
+        connection.executemany('UPDATE authors SET gender = ? WHERE id = ?',
+                               [(WG.assign(name), i) for i, name in rows])
+    print('%-22s|%10.2f s' % ('Python round trip', perf_counter() - t0))
+    expected = connection.execute('SELECT gender FROM authors'
+                                  ' ORDER BY id').fetchall()
+
+    t0 = perf_counter()
+    with connection:
+        connection.execute('UPDATE authors SET gender = assign(first_name)')
+    print('%-22s|%10.2f s' % ('UPDATE with assign()', perf_counter() - t0))
+    assert connection.execute('SELECT gender FROM authors'
+                              ' ORDER BY id').fetchall() == expected
+    connection.close()
+    print()
+
+
+def bench_fuzzy(input_path=None, n_queries=100000, max_distance=1, seed=0):
+    """Measures the build time and memory of the fuzzy_index of the full
+    names database, and its query latency on n_queries misspellings of
+    known names (one random edit) and on n_queries shuffled names, which
+    mostly have no match."""
+    import random
+    from Wiki_Gendersort import wiki_gendersort
+    from fuzzy_index import fuzzy_index
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    names_key = wiki_gendersort(input_path).names_key
+    t0 = perf_counter()
+    index = fuzzy_index(names_key, max_distance)
+    build = perf_counter() - t0
+    print('Fuzzy index of %i names (%i indexed), distance %i' %
+          (len(names_key), len(index), max_distance))
+    print('%-22s|%10.2f s' % ('Build time', build))
+    print('%-22s|%10.1f MB' % ('Memory', index.nbytes / 2**20))
+
+    r = random.Random(seed)
+    letters = string.ascii_lowercase
+
+    def misspell(name):
+        i = r.randrange(len(name))
+        edit = r.randrange(3)
+        if edit == 0:
+            return name[:i] + name[i+1:]
+        if edit == 1:
+            return name[:i] + r.choice(letters) + name[i:]
+        return name[:i] + r.choice(letters) + name[i+1:]
+
+    known = r.choices(index.names, k=n_queries)
+    for label, queries in [
+            ('Misspellings', [misspell(name) for name in known
+                              if len(name) > 1]),
+            ('Shuffled names', [''.join(r.sample(name, len(name)))
+                                for name in known])]:
+        t0 = perf_counter()
+        found = sum(index.find(query) is not None for query in queries)
+        total = perf_counter() - t0
+        print('%-22s|%10.1f us/query |%6.1f %% matched' %
+              (label, 1e6 * total / len(queries),
+               100 * found / len(queries)))
+    print()
+
+
+def bench_reclassify(evidence_path=None, n_names=694376, n_pages=15, seed=0):
+    """Measures the time of reclassify() of evidence_store.py for new
+    thresholds, on the evidence store of build_dataset(), or if
+    evidence_path does not exist, on a random store of n_names names with
+    about n_pages pages each."""
+    import numpy as np
+    from evidence_store import load_evidence, reclassify, EVIDENCE_NAME
+
+    if evidence_path is None:
+        evidence_path = cwd / EVIDENCE_NAME
+    if Path(evidence_path).exists():
+        evidence = load_evidence(evidence_path)
+    else:
+        rng = np.random.default_rng(seed)
+        pages = rng.poisson(n_pages, n_names)
+        page_offsets = np.zeros(n_names + 1, dtype=np.int64)
+        np.cumsum(pages, out=page_offsets[1:])
+        evidence = {'kind': np.zeros(n_names, dtype=np.uint8),
+                    'gender': np.zeros(n_names, dtype=np.uint8),
+                    'tries': np.ones(n_names, dtype=np.uint8),
+                    'votes': np.zeros((n_names, 2, 2), dtype=np.uint16),
+                    'page_offsets': page_offsets,
+                    'page_method': np.ones(page_offsets[-1], dtype=np.uint8),
+                    'page_counts': rng.poisson(3, (page_offsets[-1], 4))}
+    n_names = len(evidence['kind'])
+    print('Reclassification of %i names, %i pages' %
+          (n_names, len(evidence['page_method'])))
+    for thresholds in [(3, 3, 20), (2, 2, 20), (4, 3, 10)]:
+        t0 = perf_counter()
+        gender, exact = reclassify(evidence, *thresholds)
+        total = perf_counter() - t0
+        print('ratios %g/%g, %2i votes |%8.2f s |%8i incomplete' %
+              (thresholds + (total, (~exact).sum())))
+    print()
+
+
+def check_update_evidence(n_entries=30000, n_new=2000, n_replaced=500):
+    """Checks that an evidence store written by write_evidence() for the
+    records of a synthetic log, then updated by update_evidence() with
+    n_new new names and n_replaced new records of names already in it, is
+    the same as the one written at once for all the records
+
+    Returns
+    -------
+    bool
+        Whether the stores are identical.
+    """
+    import random
+    import tempfile
+    import numpy as np
+    from evidence_store import load_evidence, update_evidence, write_evidence
+    from log_reader import read_log
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        log_path = make_log_file(folder / 'NamesLog.txt', n_entries)
+        datalog = [list(entry) for entry in read_log(log_path).values()]
+        random.Random(0).shuffle(datalog)
+        old = datalog[n_new:]
+        new = datalog[:n_new]
+        # New records of names already in the store
+        for entry, other in zip(old[:n_replaced], old[-n_replaced:]):
+            new.append([entry[0], other[1], other[2], other[3]])
+        write_evidence(old, folder / 'updated.npz')
+        update_evidence(new, folder / 'updated.npz')
+        latest = {entry[0]: entry for entry in old + new}
+        write_evidence(latest.values(), folder / 'expected.npz')
+        updated = load_evidence(folder / 'updated.npz')
+        expected = load_evidence(folder / 'expected.npz')
+    identical = updated.keys() == expected.keys() and all(
+        updated[key].dtype == expected[key].dtype and
+        np.array_equal(updated[key], expected[key]) for key in expected)
+    print('update_evidence() store identical to write_evidence(): %s' %
+          identical)
+    print()
+    return identical
+
+
+def _lectdatalog_reference(cwd, backup=True):
+    """lectdatalog() before the streaming parser, for check_lectdatalog()
+    as the reference output"""
+    from bisect import bisect_left
+    from datetime import datetime
+    from os import remove
+    from os.path import isfile
+    from shutil import copyfile
+
+    datalog = []
+    datanames = []
+
+    log_path = cwd / 'NamesLog.txt'
+    if isfile(log_path):
+        nbulog = 1
+        bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
+        while isfile(cwd / bu_name):
+            nbulog += 1
+            bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
+        copyfile(log_path, cwd / bu_name)
+
+        with open(log_path) as f:
+            datalogtemp = f.read()
+        datalogtemp = datalogtemp.split('\n\n')
+        for d in datalogtemp:
+            if len(d) != 0:
+                ds = d.split('\n')
+                if len(ds) >= 2:
+                    name = ds[0]
+                    gend = ds[-1].replace(' ', '').split('=')[-1]
+                    try:
+                        time = datetime.strptime(ds[-2],
+                                                 '%Y-%m-%d %H:%M:%S.%f')
+                    except ValueError:
+                        time = datetime.strptime(ds[-2],
+                                                 '%Y-%m-%d %H:%M:%S')
+                    name_idx = bisect_left(datanames, name)
+                    if (name_idx != len(datanames) and
+                            datanames[name_idx] == name):
+                        if datalog[name_idx][2] < time:
+                            datalog[name_idx] = [name, gend, time, d]
+                    else:
+                        datanames.insert(name_idx, name)
+                        datalog.insert(name_idx, [name, gend, time, d])
+        if not backup:
+            remove(cwd / bu_name)
+
+    return datalog, datanames
+
+
+def make_log_file(path, n_entries, n_names=None, seed=0):
+    """Writes a synthetic NamesLog.txt of n_entries records of name_to_gender()
+    for n_names distinct names (n_entries // 3 by default), with repeated
+    names and times, times without microseconds, and runs of blank lines"""
+    import random
+    from datetime import datetime, timedelta
+
+    if n_names is None:
+        n_names = max(1, n_entries // 3)
+    r = random.Random(seed)
+    letters = string.ascii_lowercase
+    names = [''.join(r.choice(letters) for _ in range(r.randint(2, 9)))
+             .capitalize() + str(i) for i in range(n_names)]
+    start = datetime(2020, 1, 1)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n_entries):
+            name = r.choice(names)
+            # Few distinct times, so that some entries of a name are tied
+            time = start + timedelta(seconds=r.randrange(1000),
+                                     microseconds=r.choice([0, 0, 1, 5, 99]))
+            gend = r.choice(['M', 'F', 'UNI', 'UNK'])
+            pages = ''.join('%s X%i\nhe=%i his=%i she=%i her=%i\n' %
+                            ((name, j) + tuple(r.randrange(5)
+                                               for _ in range(4)))
+                            for j in range(r.randrange(4)))
+            record = ('%s\n1\n%s%s = %iH %iF\n%s\n%s = %s' %
+                      (name, pages, name, r.randrange(5), r.randrange(5),
+                       time, name, gend))
+            if i:
+                f.write('\n\n\n' if r.random() < 0.01 else '\n\n')
+            f.write(record)
+    return Path(path)
+
+
+def check_lectdatalog(n_entries=200000):
+    """Checks that lectdatalog() gives the same output as before on a
+    synthetic log of n_entries records"""
+    import tempfile
+    from dataset_build import lectdatalog
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        make_log_file(folder / 'NamesLog.txt', n_entries)
+        expected = _lectdatalog_reference(folder, backup=False)
+        result = lectdatalog(folder, backup=False)
+    print('lectdatalog() output identical to the reference: %s' %
+          (result == expected))
+    print()
+
+
+def bench_lectdatalog(n_entries=3*10**6, n_reference=200000):
+    """Measures the time of lectdatalog() on a synthetic log of n_entries
+    records, and of the previous parser on n_reference records (it is
+    quadratic). lectdatalog() uses read_log() of log_reader.py, which is
+    parallel above 64 MB."""
+    import tempfile
+    from dataset_build import lectdatalog
+
+    print('Log parsing')
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        for label, function, n in [
+                ('previous', _lectdatalog_reference, n_reference),
+                ('streaming', lectdatalog, n_reference),
+                ('streaming', lectdatalog, n_entries)]:
+            make_log_file(folder / 'NamesLog.txt', n)
+            t0 = perf_counter()
+            function(folder, backup=False)
+            total = perf_counter() - t0
+            print('%-10s|%10i records |%8.2f s |%10.0f records/s' %
+                  (label, n, total, n / total))
+    print()
+
+
+def bench_log_reader(n_entries=10**7, workers=None):
+    """Measures the time of read_log() of log_reader.py on a synthetic log
+    of n_entries records (about 1 GB for 10**7), with 1 to workers processes
+    (the number of CPUs by default)"""
+    import os
+    import tempfile
+    from log_reader import read_log
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as folder:
+        log_path = make_log_file(Path(folder) / 'NamesLog.txt', n_entries)
+        size = log_path.stat().st_size
+        print('Log reading, %i records, %i MB' % (n_entries, size // 2**20))
+        n_workers = 1
+        while True:
+            t0 = perf_counter()
+            read_log(log_path, workers=n_workers)
+            total = perf_counter() - t0
+            print('%3i processes |%8.2f s |%8.1f MB/s' %
+                  (n_workers, total, size / 2**20 / total))
+            if n_workers >= workers:
+                break
+            n_workers = min(2 * n_workers, workers)
+    print()
+
+
+def bench_build_log(n_entries=10**6, n_new=1000):
+    """Measures the time to resume build_dataset() with a synthetic log of
+    n_entries records and to add n_new records: before, the log was copied,
+    parsed, rewritten and parsed again at the end, and build_log.py only
+    reads the names of its database and appends the new records"""
+    import tempfile
+    from datetime import datetime
+    from shutil import copyfile
+    from build_log import build_log
+    from dataset_build import lectdatalog
+
+    def new_records():
+        return ['New%i\n1\nNew%i = 0H 0F\n%s\nNew%i = UNK' %
+                (i, i, datetime.now(), i) for i in range(n_new)]
+
+    print('Build log resume, %i records, %i new' % (n_entries, n_new))
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        log_path = make_log_file(folder / 'NamesLog.txt', n_entries)
+        copyfile(log_path, folder / 'NamesLog_ref.txt')
+
+        t0 = perf_counter()
+        datalog, datanames = lectdatalog(folder)
+        with open(log_path, 'w', encoding='utf-8') as filelog:
+            filelog.write('\n\n'.join([d[3] for d in datalog]))
+            for record in new_records():
+                filelog.write('\n\n' + record)
+        datalog, datanames = lectdatalog(folder, backup=False)
+        {k[0]: k[1] for k in datalog}
+        print('%-18s|%8.2f s' % ('previous', perf_counter() - t0))
+
+        copyfile(folder / 'NamesLog_ref.txt', log_path)
+        t0 = perf_counter()
+        build_log(log_path).close()
+        print('%-18s|%8.2f s' % ('first import', perf_counter() - t0))
+        t0 = perf_counter()
+        with build_log(log_path) as log:
+            log.names()
+            for record in new_records():
+                log.append(record)
+            log.genders()
+        print('%-18s|%8.2f s' % ('build_log', perf_counter() - t0))
+    print()
+
+
+def check_build_log_resume(n_records=1000, commit_every=100):
+    """Simulates interruptions of build_dataset() while records are appended
+    to the build log: records written after the last commit, the last one
+    cut at several positions, and checks that build_log imports the complete
+    ones, removes the cut one, and appends the next records after them, so
+    that the database and a full import of the log agree.
+
+    Returns
+    -------
+    int
+        The number of cases where they differ (0 if all is fine).
+    """
+    import tempfile
+    from datetime import datetime
+    from build_log import build_log
+
+    def record(i, gender='UNK'):
+        return 'Name%i\n1\nName%i = 0H 0F\n%s\nName%i = %s' % (
+            i, i, datetime.now(), i, gender)
+
+    last = record(n_records + 10, 'UNI')
+    cuts = {'time line': last.rindex('\n') - 3,
+            'last line': len(last) - 1,
+            'name line': 3,
+            'multibyte character': None}
+    n_errors = 0
+    for case, cut in cuts.items():
+        with tempfile.TemporaryDirectory() as folder:
+            log_path = Path(folder) / 'NamesLog.txt'
+            with build_log(log_path, commit_every=commit_every) as log:
+                for i in range(n_records):
+                    log.append(record(i))
+            # Records appended after the last commit, and a cut record
+            torn = '\n\n'.join([''] + [record(n_records + i, 'M')
+                                       for i in range(5)]).encode('utf-8')
+            if cut is None:
+                torn += ('\n\nNamé\n1').encode('utf-8')[:-3]
+            else:
+                torn += ('\n\n' + last[:cut]).encode('utf-8')
+            with open(log_path, 'ab') as f:
+                f.write(torn)
+            with build_log(log_path, commit_every=commit_every) as log:
+                log.append(record(n_records + 20, 'F'))
+                genders = log.genders()
+            log_path.with_suffix('.db').unlink()
+            with build_log(log_path) as log:
+                imported = log.genders()
+            expected = dict(('Name%i' % i, 'UNK') for i in range(n_records))
+            expected.update(('Name%i' % (n_records + i), 'M')
+                            for i in range(5))
+            expected['Name%i' % (n_records + 20)] = 'F'
+            ok = genders == imported == expected
+            n_errors += not ok
+            print('build log resumed after a record cut in its %s: %s' %
+                  (case, ok))
+    print()
+    return n_errors
+
+
+def bench_merge_names_out(input_path=None, n_new=1000):
+    """Compares the time to add n_new names to a names database sorted by
+    name with merge_names_out() of names_index.py, and to write it again and
+    compile its snapshot like build_dataset() without incremental=True"""
+    import random
+    import tempfile
+    from names_index import (compile_snapshot, merge_names_out,
+                             write_names_text)
+
+    if input_path is None:
+        input_path = cwd / 'NamesOut.txt'
+    with open(input_path, 'r', encoding='utf-8') as f:
+        names_key = dict(line.replace('\n', '').rsplit('\t', 1)
+                         for line in f if '\t' in line)
+    items = sorted(names_key.items())
+    new = set(random.Random(0).sample(range(len(items)), n_new))
+    print('Adding %i names to a names database of %i names' %
+          (n_new, len(items)))
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / 'NamesOut.txt'
+        write_names_text(path, [name + '\t' + gend
+                                for i, (name, gend) in enumerate(items)
+                                if i not in new])
+        compile_snapshot(path)
+        t0 = perf_counter()
+        merge_names_out(path, {items[i][0]: items[i][1] for i in new})
+        print('%-10s|%8.2f s' % ('merge', perf_counter() - t0))
+        t0 = perf_counter()
+        write_names_text(path, [name + '\t' + gend for name, gend in items])
+        compile_snapshot(path)
+        print('%-10s|%8.2f s' % ('full', perf_counter() - t0))
+    print()
+
+
+def _stand_in_wiki(n_names, seed=0):
+    """Names and pages of a synthetic Wikipedia for stand_in_api(): pages of
+    people for each name, with disambiguation pages, redirects, search
+    results without page, and listings for the search of method 2"""
+    import random
+
+    r = random.Random(seed)
+    letters = string.ascii_lowercase
+    names = sorted({''.join(r.choice(letters) for _ in range(r.randint(3, 8)))
+                    .capitalize() for _ in range(n_names)})
+    pages = {}
+    searches = {}
+    for name in names:
+        bias = r.random()
+        results = []
+        for i in range(r.randint(0, 12)):
+            title = '%s %s%s' % (name, r.choice('ABCDEFGH'),
+                                 r.choice(letters) * r.randint(1, 3) + str(i))
+            results.append(title)
+            x = r.random()
+            if x < 0.05:
+                # Search result without page
+                continue
+            if x < 0.15:
+                options = ['%s %s%i' % (name, r.choice('XYZ'), j)
+                           for j in range(r.randint(0, 5))]
+                pages[title] = ('disambiguation', options)
+                for option in options:
+                    pages.setdefault(option, ('page', 'She was. Her work.'))
+            elif x < 0.2:
+                target = title + ' (person)'
+                pages[title] = ('redirect', target)
+                pages[target] = ('page', 'He was. His work.')
+            else:
+                words = [r.choice(['he', 'his']) if r.random() < bias else
+                         r.choice(['she', 'her', 'the'])
+                         for _ in range(r.randint(0, 40))]
+                pages[title] = ('page', ' '.join(words) + '.')
+        for i in range(r.randint(0, 3)):
+            results.append('List of %s %s' % (
+                r.choice(['men', 'women', 'male', 'female']), name))
+        searches[name] = results
+    return names, pages, searches
+
+
+def _run_stand_in(wiki, latency, connection, failing):
+    """Serves the MediaWiki API queries of the wikipedia package for a
+    synthetic Wikipedia, and sends the port to the connection. The searches
+    of the names of failing are always answered with an HTTP 503 status."""
+    import gzip
+    import json
+    import time
+    import zlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+
+    names, pages, searches = wiki
+    search_titles = {title for results in searches.values()
+                     for title in results}
+    page_ids = {title: str(i + 1) for i, title in enumerate(sorted(pages))}
+
+    def info(title):
+        return {'pageid': int(page_ids[title]), 'ns': 0, 'title': title,
+                'fullurl': 'http://localhost/wiki/' + title}
+
+    def respond(params):
+        if params.get('list') == 'search':
+            query = params['srsearch']
+            if zlib.crc32(query.encode('utf-8')) % 50 == 0:
+                return {'error': {'info': 'Pool queue is full'}}
+            if 'srinfo' in params:
+                results = [query] if query in search_titles else []
+            else:
+                results = searches.get(query, [])
+            return {'query': {'search': [{'ns': 0, 'title': title}
+                                         for title in results[
+                                             :int(params['srlimit'])]]}}
+        title = params['titles']
+        if params['prop'] == 'info|pageprops':
+            if title not in pages:
+                return {'query': {'pages': {'-1': {'ns': 0, 'title': title,
+                                                   'missing': ''}}}}
+            kind, value = pages[title]
+            if kind == 'redirect':
+                return {'query': {'redirects': [{'from': title,
+                                                 'to': value}],
+                                  'pages': {page_ids[value]: info(value)}}}
+            page = info(title)
+            if kind == 'disambiguation':
+                page['pageprops'] = {'disambiguation': ''}
+            return {'query': {'pages': {page_ids[title]: page}}}
+        if params['prop'] == 'revisions':
+            html = ('<ul><li class="toclevel-1 tocsection-1">'
+                    '<a href="#People">People</a></li>' +
+                    ''.join('<li><a href="/wiki/%s">%s</a>, someone</li>' %
+                            (option, option) for option in pages[title][1]) +
+                    '<li>Unlinked</li></ul>')
+            return {'query': {'pages': {page_ids[title]: {
+                'revisions': [{'*': html}]}}}}
+        page = info(title)
+        page['extract'] = pages[title][1]
+        return {'query': {'pages': {page_ids[title]: page}}}
+
+    class handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            params = {key: values[0] for key, values in
+                      parse_qs(urlsplit(self.path).query,
+                               keep_blank_values=True).items()}
+            if latency:
+                time.sleep(latency)
+            if params.get('srsearch') in failing:
+                self.send_response(503)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = json.dumps(respond(params)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, 1)
+                self.send_header('Content-Encoding', 'gzip')
+            if len(body) % 2:
+                # Some responses are chunked, like the ones of the API
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                half = len(body) // 2
+                for chunk in (body[:half], body[half:], b''):
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            else:
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+def _failing_names(names, n_failing):
+    """The last n_failing names of the stand-in API that name_to_gender()
+    searches, which are not initials"""
+    from Wiki_Gendersort import countalpha, countvowel
+
+    searched = [name for name in names
+                if countalpha(name) > 1 and countvowel(name) > 0]
+    return set(searched[len(searched) - n_failing:])
+
+
+def stand_in_api(n_names=1000, latency=0.0, seed=0, n_failing=0):
+    """Starts a local stand-in of the MediaWiki API of Wikipedia in a new
+    process, answering the queries of search() and summary() for a
+    synthetic Wikipedia of n_names names after latency seconds. The searches
+    of n_failing names (see _failing_names()) always fail with an HTTP 503
+    status.
+
+    Returns
+    -------
+    tuple
+        (process, API URL, names). Terminate the process when done.
+    """
+    from multiprocessing import Pipe, Process
+
+    wiki = _stand_in_wiki(n_names, seed)
+    failing = _failing_names(wiki[0], n_failing)
+    receiver, sender = Pipe(False)
+    process = Process(target=_run_stand_in,
+                      args=(wiki, latency, sender, failing), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, 'http://127.0.0.1:%i/w/api.php' % port, wiki[0]
+
+
+def _strip_times(log_data):
+    "Log record of name_to_gender() without its times"
+    return '\n'.join(line for line in log_data.split('\n')
+                     if not line[:2] == '20')
+
+
+def check_async_engine(n_names=200, n_failing=5):
+    """Checks that the asyncio engine of async_fetch.py gives the same
+    genders and log records as name_to_gender() with the wikipedia package,
+    for the names of a stand-in API, and that it reports the n_failing names
+    whose searches always fail in engine.failed instead of returning them"""
+    import wikipedia
+    from async_fetch import async_engine
+    from dataset_build import name_to_gender
+
+    process, api_url, names = stand_in_api(n_names, n_failing=n_failing)
+    failing = _failing_names(names, n_failing)
+    names += ['', 'J.', 'Qx']
+    previous_url = wikipedia.wikipedia.API_URL
+    wikipedia.wikipedia.API_URL = api_url
+    try:
+        expected = {}
+        for name in names:
+            if name not in failing:
+                gender, log_data = name_to_gender(name)
+                expected[name] = (gender, _strip_times(log_data))
+        engine = async_engine(api_url, concurrency=64, connections=16,
+                              retries=2)
+        result = {}
+        for gender, log_data in engine.imap_unordered(names):
+            result[log_data.split('\n')[0]] = (gender, _strip_times(log_data))
+    finally:
+        wikipedia.wikipedia.API_URL = previous_url
+        process.terminate()
+    failed = {name for name, _ in engine.failed}
+    print('async engine, %i names: same genders and logs as the wikipedia '
+          'package: %s, failing names reported as failed: %s '
+          '(%i requests)' %
+          (len(names), result == expected, failed == failing,
+           engine.n_requests))
+    print()
+
+
+def bench_async_engine(n_names=2000, latency=0.05, n_pool=25,
+                       concurrency=256, connections=64):
+    """Compares the names per second of name_to_gender() in a Pool of
+    n_pool processes, like build_dataset(), and of the asyncio engine of
+    async_fetch.py, for a stand-in API answering after latency seconds"""
+    from multiprocessing import Pool
+    import wikipedia
+    from async_fetch import async_engine
+    from dataset_build import name_to_gender
+
+    process, api_url, names = stand_in_api(n_names, latency)
+    print('Fetch engines, %i names, %i ms of latency' %
+          (len(names), 1000 * latency))
+    previous_url = wikipedia.wikipedia.API_URL
+    wikipedia.wikipedia.API_URL = api_url
+    try:
+        t0 = perf_counter()
+        with Pool(n_pool) as pool:
+            for _ in pool.imap_unordered(name_to_gender, names):
+                pass
+        total = perf_counter() - t0
+        print('%-24s|%8.2f s |%8.1f names/s' %
+              ('pool of %i processes' % n_pool, total, len(names) / total))
+        engine = async_engine(api_url, concurrency, connections)
+        t0 = perf_counter()
+        for _ in engine.imap_unordered(names):
+            pass
+        total = perf_counter() - t0
+        print('%-24s|%8.2f s |%8.1f names/s' %
+              ('async, %i at once' % concurrency, total, len(names) / total))
+    finally:
+        wikipedia.wikipedia.API_URL = previous_url
+        process.terminate()
+    print()
+
+
+if __name__ == '__main__':
+    bench_memory()
+    bench_import_time()
+    check_nameclean()
+    bench_nameclean()
+    check_threads()
+    bench_assign_many()
+    bench_file_assign()
+    bench_file_assign_scaling()
+    bench_cli()
+    bench_server()
+    bench_sqlite()
+    bench_fuzzy()
+    bench_reclassify()
+    check_update_evidence()
+    check_lectdatalog()
+    bench_lectdatalog()
+    bench_log_reader()
+    bench_build_log()
+    check_build_log_resume()
+    bench_merge_names_out()
+    check_async_engine()
+    bench_async_engine()
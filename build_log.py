@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Checkpointed build log of build_dataset().
+
+The records of name_to_gender() are only ever appended to NamesLog.txt, and
+the latest result of each name is kept in an SQLite database next to it
+(NamesLog.db), in WAL mode:
+
+    results(name, gender, time, record)
+        Latest record of each name, indexed by name.
+    meta(key, value)
+        'log_size': number of bytes of NamesLog.txt imported in results.
+
+The appended records are written to the log and fsynced, then committed in
+results with the new log size every commit_every records, so that after an
+interruption only the records appended after the last commit are read again.
+The whole log is imported when there is no database yet (logs of previous
+versions) or when the log is smaller than the size in the database (log
+replaced). A record cut by an interruption while it was appended is removed
+from the end of the log, so that the next records are appended after the
+last complete one. Resuming a build therefore takes a time proportional to the
+remaining work instead of the size of the log.
+
+The WAL of the database is checkpointed every checkpoint_every records, and
+compact() rewrites the log with only the latest record of each name when
+the superseded records take too much space.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+from log_reader import log_entry, log_time, read_log
+from names_index import GENDERS
+
+LOG_DB_SUFFIX = '.db'
+
+_UPSERT = ('INSERT INTO results VALUES (?, ?, ?, ?) '
+           'ON CONFLICT(name) DO UPDATE SET gender = excluded.gender, '
+           'time = excluded.time, record = excluded.record '
+           'WHERE excluded.time > results.time')
+
+
+def _row(record):
+    "Row of results of a log record, or None"
+    entry = log_entry(record)
+    if entry is None:
+        return None
+    name, gend, time = entry
+    # str(datetime) sorts like the times in SQLite
+    return name, gend, str(time), record
+
+
+def _appended_row(record):
+    """Row of results of a record appended by build_log, or None if it is
+    incomplete: its last line must be 'name = gender' with a gender of
+    GENDERS, which a record cut during its last line is not"""
+    try:
+        record = record.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    row = _row(record)
+    if row is None or row[1] not in GENDERS or \
+            not record.endswith('\n' + row[0] + ' = ' + row[1]):
+        return None
+    return row
+
+
+class build_log():
+    """Append-only build log with an index of the latest result of each
+    name.
+
+    Parameters
+    ----------
+    log_path: str or Path
+        Path of the log, NamesLog.txt. It is created if needed.
+
+    db_path: str or Path, optional
+        Path of the SQLite database. If None, the path of the log with
+        the suffix .db. Default is None.
+
+    commit_every: int, optional
+        Number of appended records between two commits. At most this
+        number of records are imported again from the log after an
+        interruption. Default is 100.
+
+    checkpoint_every: int, optional
+        Number of appended records between two checkpoints of the WAL.
+        Default is 10000.
+    """
+
+    def __init__(self,
+                 log_path,
+                 db_path=None,
+                 commit_every=100,
+                 checkpoint_every=10000):
+        self.log_path = Path(log_path)
+        if db_path is None:
+            db_path = self.log_path.with_suffix(LOG_DB_SUFFIX)
+        self.db_path = Path(db_path)
+        self.commit_every = commit_every
+        self.checkpoint_every = checkpoint_every
+        self._pending = []
+        self._since_checkpoint = 0
+        self._log_file = None
+        self._unsynced = False
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # The log is fsynced before each commit, so that a commit lost
+        # on power failure is imported again from the log
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                    '(name TEXT PRIMARY KEY NOT NULL, '
+                                    'gender TEXT NOT NULL, '
+                                    'time TEXT NOT NULL, '
+                                    'record TEXT NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta '
+                                    '(key TEXT PRIMARY KEY NOT NULL, '
+                                    'value) WITHOUT ROWID')
+        self._sync()
+
+    def _get_meta(self, key, default=None):
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?',
+                                      (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, key, value):
+        self.connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                (key, value))
+
+    @property
+    def log_size(self):
+        "Number of bytes of the log imported in the database"
+        return self._get_meta('log_size', 0)
+
+    def _sync(self):
+        "Imports the records of the log that are not in the database"
+        size = os.path.getsize(self.log_path) if self.log_path.exists() else 0
+        imported = self.log_size
+        if size == imported:
+            return
+        if size < imported or imported == 0:
+            print('Importing ' + self.log_path.name)
+            latest = read_log(self.log_path) if size else {}
+            rows = [(name, gend, str(time), record) for name, (_, gend, time,
+                    record) in sorted(latest.items())]
+            with self.connection:
+                self.connection.execute('DELETE FROM results')
+                self.connection.executemany(_UPSERT, rows)
+                self._set_meta('log_size', size)
+            return
+        # Records appended after the last commit, up to the first one that
+        # is incomplete, where the log is cut
+        with open(self.log_path, 'rb') as f:
+            f.seek(imported)
+            tail = f.read(size - imported)
+        rows = []
+        end = imported
+        pos = imported
+        for record in tail.split(b'\n\n'):
+            if record:
+                row = _appended_row(record)
+                if row is None:
+                    break
+                rows.append(row)
+                end = pos + len(record)
+            pos += len(record) + 2
+        if end < size:
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+            print('Incomplete record removed from the end of ' +
+                  self.log_path.name)
+        with self.connection:
+            self.connection.executemany(_UPSERT, rows)
+            self._set_meta('log_size', end)
+        print('%i records imported from the end of %s' %
+              (len(rows), self.log_path.name))
+
+    def append(self, record):
+        "Appends a record of name_to_gender() to the log"
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+            self._log_file.seek(0, os.SEEK_END)
+        if self._log_file.tell() > 0:
+            record_bytes = ('\n\n' + record).encode('utf-8')
+        else:
+            record_bytes = record.encode('utf-8')
+        self._log_file.write(record_bytes)
+        self._unsynced = True
+        row = _row(record)
+        if row is not None:
+            self._pending.append(row)
+        if len(self._pending) >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        "Makes the appended records durable and commits them in the database"
+        if not self._unsynced:
+            return
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        with self.connection:
+            self.connection.executemany(_UPSERT, self._pending)
+            self._set_meta('log_size', self._log_file.tell())
+        self._since_checkpoint += len(self._pending)
+        self._pending = []
+        self._unsynced = False
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.connection.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            self._since_checkpoint = 0
+
+    def __len__(self):
+        self.commit()
+        return self.connection.execute(
+            'SELECT count(*) FROM results').fetchone()[0]
+
+    def __contains__(self, name):
+        self.commit()
+        return self.connection.execute(
+            'SELECT 1 FROM results WHERE name = ?', (name,)).fetchone() \
+            is not None
+
+    def names(self):
+        "Set of the names of the log"
+        self.commit()
+        return {row[0] for row in
+                self.connection.execute('SELECT name FROM results')}
+
+    def genders(self, names=None):
+        """Dict of the latest gender of each name, or of the names of a list
+        that are in the log"""
+        self.commit()
+        if names is None:
+            return dict(self.connection.execute('SELECT name, gender '
+                                                'FROM results'))
+        genders = {}
+        names = list(names)
+        # Below the default limit of 999 parameters of SQLite
+        for i in range(0, len(names), 500):
+            batch = names[i:i+500]
+            genders.update(self.connection.execute(
+                'SELECT name, gender FROM results WHERE name IN (%s)' %
+                ', '.join('?' * len(batch)), batch))
+        return genders
+
+    def entries(self, names=None):
+        """[name, gender, time, record] of the latest record of each name,
+        or of the names of a list that are in the log, sorted by name, like
+        lectdatalog()"""
+        self.commit()
+        query = 'SELECT name, gender, time, record FROM results'
+        if names is None:
+            rows = list(self.connection.execute(query + ' ORDER BY name'))
+        else:
+            rows = []
+            names = list(names)
+            # Below the default limit of 999 parameters of SQLite
+            for i in range(0, len(names), 500):
+                batch = names[i:i+500]
+                rows += self.connection.execute(
+                    query + ' WHERE name IN (%s)' %
+                    ', '.join('?' * len(batch)), batch)
+            rows.sort()
+        return [[name, gend, log_time(time), record]
+                for name, gend, time, record in rows]
+
+    def compact(self, min_ratio=2.0):
+        """Rewrites the log with only the latest record of each name, in
+        alphabetical order, if the log is more than min_ratio times larger.
+        The new log replaces the previous one atomically.
+
+        Returns
+        -------
+        bool
+            Whether the log was rewritten.
+        """
+        self.commit()
+        live_size, n = self.connection.execute(
+            'SELECT total(length(CAST(record AS BLOB))), count(*) '
+            'FROM results').fetchone()
+        live_size += 2 * max(n - 1, 0)
+        if self.log_size <= min_ratio * live_size:
+            return False
+        previous_size = self.log_size
+        self.close_log()
+        tmp_path = self.log_path.with_name(self.log_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            first = True
+            for (record,) in self.connection.execute(
+                    'SELECT record FROM results ORDER BY name'):
+                if not first:
+                    f.write(b'\n\n')
+                f.write(record.encode('utf-8'))
+                first = False
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp_path, self.log_path)
+        with self.connection:
+            self._set_meta('log_size', size)
+        self.connection.execute('VACUUM')
+        print('%s compacted from %i to %i bytes' %
+              (self.log_path.name, previous_size, size))
+        return True
+
+    def reset(self):
+        """Starts a new log and empties the database. The previous log is
+        renamed NamesLog_buN.txt."""
+        self.close_log()
+        if self.log_path.exists() and os.path.getsize(self.log_path):
+            nbulog = 1
+            bu_path = self.log_path.with_name(
+                self.log_path.stem + '_bu%i' % nbulog + self.log_path.suffix)
+            while bu_path.exists():
+                nbulog += 1
+                bu_path = self.log_path.with_name(
+                    self.log_path.stem + '_bu%i' % nbulog +
+                    self.log_path.suffix)
+            os.replace(self.log_path, bu_path)
+            print('Moving ' + self.log_path.name + ' to ' + bu_path.name)
+        with self.connection:
+            self.connection.execute('DELETE FROM results')
+            self._set_meta('log_size', 0)
+
+    def close_log(self):
+        "Commits the appended records and closes the log file"
+        self.commit()
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def close(self):
+        "Commits the appended records, checkpoints the WAL and closes"
+        self.close_log()
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Reading and writing of compressed text files for Wiki-Gendersort.
+
+open_text() opens a utf-8 text file compressed with gzip, bz2, xz or zstd
+(zstd needs the zstandard package), or not compressed.
+The compression is detected from the first bytes of the file when reading,
+and from the extension of the file when writing.
+"""
+
+import io
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Thread
+
+# Extension and first bytes of each compression format
+COMPRESSIONS = {'gzip': ('.gz', b'\x1f\x8b'),
+                'bz2': ('.bz2', b'BZh'),
+                'xz': ('.xz', b'\xfd7zXZ\x00'),
+                'zstd': ('.zst', b'\x28\xb5\x2f\xfd')}
+
+
+def compression_suffix(path):
+    "Returns the compression extension of a path ('.gz', ...), or ''"
+    suffix = Path(path).suffix
+    if suffix in {ext for ext, _ in COMPRESSIONS.values()}:
+        return suffix
+    return ''
+
+
+def strip_compression(path):
+    "Returns a path without its compression extension"
+    path = Path(path)
+    if compression_suffix(path):
+        return path.with_suffix('')
+    return path
+
+
+def find_compressed(path):
+    """Returns path if it exists, or else the first existing compressed
+    version of path (path + '.gz', ...), or else path."""
+    path = Path(path)
+    if not path.exists():
+        for ext, _ in COMPRESSIONS.values():
+            compressed_path = path.with_name(path.name + ext)
+            if compressed_path.exists():
+                return compressed_path
+    return path
+
+
+def detect_compression(path):
+    """Returns the compression format of a file from its first bytes,
+    or None if it is not compressed"""
+    with open(path, 'rb') as f:
+        return _magic_compression(f.read(6))
+
+
+def _magic_compression(head):
+    "Compression format of the first bytes of a file, or None"
+    for compression, (_, magic) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def suffix_compression(path):
+    """Returns the compression format of a file from its extension,
+    or None if it is not compressed"""
+    suffix = compression_suffix(path)
+    for compression, (ext, _) in COMPRESSIONS.items():
+        if suffix == ext:
+            return compression
+    return None
+
+
+def _zstandard():
+    "Imports the optional zstandard package"
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The zstandard package is needed for '
+                          '.zst files: pip install zstandard')
+    return zstandard
+
+
+def open_binary(path, mode='r', compression=None):
+    """Opens a possibly compressed file as a binary stream.
+
+    Parameters
+    ----------
+    path: str or Path
+        Path of the file.
+
+    mode: str, optional
+        'r' to read or 'w' to write. Default is 'r'.
+
+    compression: str, optional
+        'gzip', 'bz2', 'xz' or 'zstd'. If None, it is detected from the first
+        bytes of the file when reading, and from its extension when writing.
+        Default is None.
+    """
+    if mode not in {'r', 'w'}:
+        raise ValueError('mode should be r or w')
+    if compression is None:
+        if mode == 'r':
+            compression = detect_compression(path)
+        else:
+            compression = suffix_compression(path)
+    # The compression modules are only imported when needed, to keep the
+    # import of Wiki_Gendersort fast
+    if compression is None:
+        return open(path, mode + 'b')
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, mode + 'b')
+    if compression == 'bz2':
+        import bz2
+        return bz2.open(path, mode + 'b')
+    if compression == 'xz':
+        import lzma
+        return lzma.open(path, mode + 'b')
+    if compression == 'zstd':
+        zstandard = _zstandard()
+        f = open(path, mode + 'b')
+        if mode == 'r':
+            return zstandard.ZstdDecompressor().stream_reader(f,
+                                                              closefd=True)
+        return zstandard.ZstdCompressor().stream_writer(f, closefd=True)
+    raise ValueError('Unknown compression ' + repr(compression))
+
+
+def open_bytes(data):
+    """Opens the content of a possibly compressed file, already read in
+    memory, as a binary stream. The compression is detected from the first
+    bytes."""
+    compression = _magic_compression(data[:6])
+    raw = io.BytesIO(data)
+    if compression is None:
+        return raw
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw)
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(raw)
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw)
+    return _zstandard().ZstdDecompressor().stream_reader(raw)
+
+
+class prefetch_reader(io.RawIOBase):
+    """Binary stream reading another binary stream in a background thread,
+    so that the decompression of a file is done while its content is used.
+
+    Parameters
+    ----------
+    raw: binary stream
+        The stream to read, closed with the prefetch_reader.
+
+    block_size: int, optional
+        Number of bytes read at once. Default is 1 MB.
+
+    n_blocks: int, optional
+        Maximum number of blocks read in advance. Default is 8.
+    """
+
+    def __init__(self, raw, block_size=2**20, n_blocks=8):
+        self.raw = raw
+        self._blocks = Queue(n_blocks)
+        self._block = b''
+        self._pos = 0
+        self._error = None
+        self._stop = False
+        self._thread = Thread(target=self._fill,
+                              args=(block_size,),
+                              daemon=True)
+        self._thread.start()
+
+    def _fill(self, block_size):
+        "Reads the blocks of raw in the background thread"
+        try:
+            while not self._stop:
+                block = self.raw.read(block_size)
+                self._blocks.put(block)
+                if not block:
+                    break
+        except Exception as e:
+            self._error = e
+            self._blocks.put(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._block is None:
+            return 0
+        if self._pos == len(self._block):
+            block = self._blocks.get()
+            if not block:
+                self._block = None
+                if self._error is not None:
+                    raise self._error
+                return 0
+            self._block = block
+            self._pos = 0
+        n = min(len(buffer), len(self._block) - self._pos)
+        buffer[:n] = self._block[self._pos:self._pos+n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop = True
+            # Unblocks the thread if it waits for space in the queue
+            while self._thread.is_alive():
+                try:
+                    self._blocks.get(timeout=0.1)
+                except Empty:
+                    pass
+            self.raw.close()
+        super().close()
+
+
+def open_text(path, mode='r', compression=None, prefetch=False,
+              newline=None):
+    """Opens a possibly compressed utf-8 text file, like open().
+
+    Parameters
+    ----------
+    path: str or Path
+        Path of the file.
+
+    mode: str, optional
+        'r' to read or 'w' to write. Default is 'r'.
+
+    compression: str, optional
+        'gzip', 'bz2', 'xz' or 'zstd'. If None, it is detected from the first
+        bytes of the file when reading, and from its extension (.gz, .bz2,
+        .xz or .zst) when writing. Default is None.
+
+    prefetch: bool, optional
+        When reading, reads and decompresses the file in a background
+        thread. Default is False.
+
+    newline: str, optional
+        Same as the newline parameter of open(). Default is None.
+    """
+    stream = open_binary(path, mode, compression)
+    if mode == 'r' and prefetch:
+        stream = io.BufferedReader(prefetch_reader(stream))
+    return io.TextIOWrapper(stream, encoding='utf-8', newline=newline)
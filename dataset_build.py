@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Library to build the Wiki-Gendersort dataset.
+This code is associated to the paper
+Wiki-Gendersort: Automatic gender detection using first names in Wikipedia
+https://osf.io/preprints/socarxiv/ezw7p/
+
+Use build_dataset() to build the dataset from scratch with Wikiedia searches.
+Those functions are also available from Wiki_Gendersort, which imports this
+module only when they are used.
+"""
+
+from os.path import isfile
+from os import remove
+from shutil import copyfile
+from wikipedia import search, summary
+from datetime import datetime
+import wikipedia
+import json
+from pathlib import Path
+from multiprocessing import Pool
+from tqdm import tqdm
+from Wiki_Gendersort import countalpha, countvowel
+from names_index import (compile_snapshot, merge_names_out, missing_names,
+                         read_sorted_names, write_names_text)
+from compressed_io import find_compressed, open_text
+from evidence_store import (EVIDENCE_NAME, evidence_names, load_evidence,
+                            update_evidence, write_evidence)
+from log_reader import read_log
+from build_log import build_log
+
+
+def lectdatalog(cwd, backup=True):
+    "Cleans and imports data from log file"
+    # Cleans log
+    datalog = []
+    datanames = []
+
+    log_path = cwd / 'NamesLog.txt'
+    if isfile(log_path):
+        # Back-up of current log file
+        nbulog = 1
+        bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
+        while isfile(cwd / bu_name):
+            nbulog += 1
+            bu_name = log_path.stem + '_bu%i' % nbulog + log_path.suffix
+        copyfile(log_path, cwd / bu_name)
+        if backup:
+            print('Copying ' + log_path.name + ' into ' + bu_name)
+
+        print('Importing ' + log_path.stem)
+        latest = read_log(log_path)
+        datanames = sorted(latest)
+        datalog = [list(latest[name]) for name in datanames]
+        if not backup:
+            remove(cwd / bu_name)
+
+    return datalog, datanames
+
+
+def name_to_gender(name):
+    "Assigns gender to a first name based on a wikipedia search"
+    steps = name_to_gender_steps(name)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                if request[0] == 'search':
+                    result = search(request[1], results=1000)
+                else:
+                    result = summary(request[1])
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+def name_to_gender_steps(name):
+    """Classification of name_to_gender(), as a generator of its Wikipedia
+    requests, so that it can be run by other fetch engines (async_fetch.py).
+
+    The generator yields ('search', query) for search(query, results=1000)
+    and ('summary', title) for summary(title). The result of each request
+    is sent back to the generator, or its exception is thrown into it.
+
+    Returns
+    -------
+    tuple
+        (gender, log_data), as the value of the StopIteration.
+    """
+
+    log_data = name
+    gender = 'UNK'
+    if len(name) == 0 or len(name.split()) == 0 or name.upper() == 'NULL':
+        gender = 'INI'
+        log_data += '\nname is empty\n'
+        log_data += str(datetime.now()) + '\n'
+        log_data += name + ' = ' + gender
+        return gender, log_data
+
+    elif countalpha(name) <= 1 or countvowel(name) == 0:
+        gender = 'INI'
+        log_data += '\nname is initials\n'
+        log_data += str(datetime.now()) + '\n'
+        log_data += name + ' = ' + gender
+        return gender, log_data
+
+    # genh: # of pages refering to a man. genf: woman.
+    genh = 0
+    genf = 0
+    nam = name
+    # Search parameters if previous search was inconclusive
+    # 0: Presence of a page FIRST_NAME (given name)
+    # 1: FIRST_NAME LAST_NAME
+    # 2: Analysis of page listing (not their content)
+    # 3: LAST_NAME FIRST_NAME
+    ntry = 0
+    while ntry <= 1 and gender == 'UNK':
+        ntry += 1
+    # filtered pages, which are the ones kept from the wikipedia search.
+    # The second list contains added disambiguations, if needed
+        fpag = []
+        fpag2 = []
+        log_data += '\n'+str(ntry)+'\n'
+        try:
+            if ntry == 1:
+                for pag in (yield 'search', nam):
+                    if (pag[:len(nam)+1] == nam+' ' and
+                            pag[len(nam)+1].isupper()):
+                        fpag.append(pag)
+            if ntry == 2:
+                fpag.append(''.join((yield 'search', nam)))
+        except wikipedia.exceptions.WikipediaException:
+            pass
+        except json.decoder.JSONDecodeError:
+            pass
+    # Pages analysis
+        for pag in fpag:
+            tpag = ''
+            heocc = 0
+            hisocc = 0
+            sheocc = 0
+            herocc = 0
+            if ntry == 1:
+                log_data += pag
+                # If page does not exist of is a disambiguation
+                try:
+                    # The following line if the true code bottleneck
+                    tpag = (yield 'summary', pag).lower()
+                    log_data += '\n'
+                except wikipedia.exceptions.DisambiguationError as e:
+                    log_data += ' - DISAMBIGUATION\n'
+                    fpag2.append([])
+                    for dpag in e.options:
+                        if (((dpag[:len(nam)+1] == nam+' ' and
+                              dpag[len(nam)+1].isupper() and
+                              ntry == 1) or
+                             (dpag[-len(nam)-1:] == ' '+nam or
+                              ' '+nam+' (' in dpag)) and
+                                dpag not in fpag and
+                                len(fpag2[-1]) < 20):
+                            fpag2[-1].append(dpag)
+                    if len(fpag2[-1]) == 0:
+                        fpag2.pop()
+                    elif fpag2[-1][0] not in fpag:
+                        fpag.insert(fpag.index(pag)+1, fpag2[-1].pop(0))
+                except wikipedia.exceptions.PageError:
+                    pass
+                except wikipedia.exceptions.WikipediaException:
+                    pass
+                except json.decoder.JSONDecodeError:
+                    pass
+            elif ntry == 2:
+                tpag = pag.lower()
+            # Counts the number of 'he', 'his', 'she' and 'her'
+            # (and variants) to identify the gender
+            if len(tpag) != 0:
+                tpag = tpag.replace('\n', ' ')
+                tpag = tpag.replace('(', ' ')
+                tpag = tpag.replace(')', ' ')
+                tpag = tpag.replace(",", ' ')
+                tpag = tpag.replace(".", ' ')
+                tpag = tpag.replace("'", ' ')
+                if ntry == 1:
+                    heocc = tpag.count(' he ')
+                    sheocc = tpag.count(' she ')
+                    hisocc = tpag.count(' his ')
+                    herocc = tpag.count(' her ')
+                    log_data += ('he='+str(heocc) +
+                                 ' his='+str(hisocc) +
+                                 ' she='+str(sheocc) +
+                                 ' her='+str(herocc) +
+                                 '\n')
+                elif ntry == 2:
+                    heocc = tpag.count(' men ')
+                    hisocc = tpag.count(' male ')
+                    sheocc = tpag.count(' women ')
+                    herocc = tpag.count(' female ')
+                    log_data += ('men='+str(heocc) +
+                                 ' male='+str(hisocc) +
+                                 ' women='+str(sheocc) +
+                                 ' female='+str(herocc) +
+                                 '\n')
+                if heocc+hisocc >= 3*(sheocc+herocc) and heocc+hisocc > 0:
+                    genh += 1
+                elif (sheocc+herocc >= 3*(heocc+hisocc) and
+                      sheocc+herocc > 0):
+                    genf += 1
+            # Adding an element of fpag2 if we don't have enough data
+            if (fpag.index(pag) == len(fpag)-1) and (len(fpag2) > 0):
+                if len(fpag2[0]) > 0:
+                    if fpag2[0][0] not in fpag:
+                        fpag.append(fpag2[0].pop(0))
+                if len(fpag2[0]) > 0:
+                    fpag2.append(fpag2[0])
+                if len(fpag2) == 1 and len(fpag2[0]) == 0:
+                    fpag2 = []
+                else:
+                    fpag2 = fpag2[1:]
+            if genh + genf >= 20:
+                break
+            # Unisex if less than 3/4 of occurences are of the same gender
+        if genh >= 3*genf and genh > 0:
+            gender = 'M'
+        if genf >= 3*genh and genf > 0:
+            gender = 'F'
+        if (gender == 'UNK' and (genh != 0 or genf != 0)):
+            gender = 'UNI'
+        if ntry <= 2:
+            log_data += name + ' = %iH %iF\n' % (genh, genf)
+        log_data += str(datetime.now()) + '\n'
+        log_data += name + ' = ' + gender
+
+    return gender, log_data
+
+
+def build_dataset(reboot=False,
+                  incremental=False,
+                  engine='pool',
+                  api_url=None,
+                  concurrency=256):
+    """Builds the database of gender based on Wikipedia search.
+
+    This code takes a list of first names separated by a line break \n
+    in file Names.txt and constructs a database in NamesOut.txt by assigning
+    them a gender.
+
+    NamesOut.txt will contain the same names, but followed by the
+    assigned gender (both of them being seprated by a tab \t).
+
+    The gender attribution (M, F, UNI, INI or UNK) is done according to the
+    occurrence of first names on Wikipedia pages concerning them.
+    M: male
+    F: female
+    UNI: unisex
+    INI: initials
+    UNK: unknown
+
+    Names.txt and NamesOut.txt can be compressed (Names.txt.gz, ...).
+
+    If NamesOut.txt already exists, it will be ignored and overwritten.
+    With incremental=True, NamesOut.txt is instead sorted by name, and the
+    names of Names.txt that are not in it yet are added with a sorted merge,
+    along with its snapshot. Only the lookups of the new names in the log
+    take a time proportional to their number: NamesOut.txt is still read,
+    hashed and written again, and the keys of the snapshot copied, since
+    both files are replaced atomically, but neither is parsed into a dict
+    nor sorted again. The names that are no longer in Names.txt are kept by
+    the merge. An unsorted NamesOut.txt (written without incremental=True) is
+    written again, sorted. In both cases, NamesOut.txt and its snapshot are
+    replaced atomically, so that wiki_gendersort never reads partially
+    written files.
+    Information on gender assignment is present in the log file (NamesLog.txt).
+    The pronoun counts of the pages analysed for each name are also saved in
+    NamesEvidence.npz, so that NamesOut.txt can be regenerated for other
+    thresholds with write_names_out() from evidence_store.py. With
+    incremental=True, only the records of the names that are not in
+    NamesEvidence.npz yet are added to it.
+    The log file is only appended to, and the latest result of each name is
+    indexed in NamesLog.db (see build_log.py), so that the code launches back
+    where it was in the case it got interrupted, without reading the log
+    again. The log is compacted at the end when most of it is superseded.
+
+    Set reboot=True if you want to disregard log files and start from scratch.
+    The previous log is then renamed NamesLog_buN.txt.
+
+    The names are fetched by a pool of 25 processes running name_to_gender()
+    with engine='pool', and by the asyncio engine of async_fetch.py with
+    engine='async', which processes concurrency names at once in a single
+    process over pooled keep-alive connections to the MediaWiki API at
+    api_url (the English Wikipedia by default). Both engines give the same
+    genders and log records.
+    """
+
+    if engine not in {'pool', 'async'}:
+        raise ValueError('Unknown fetch engine ' + repr(engine))
+    cwd = Path(__file__).parent.absolute()
+    inputnames = find_compressed(cwd / 'Names.txt')
+    names_out_path = find_compressed(cwd / 'NamesOut.txt')
+
+    # namestot: List of str names to attribute a gender to
+    namestot_raw = ['']
+    with open_text(inputnames) as namefile:
+        namestot_raw = namefile.read().split('\n')
+
+    print('Names sorting')
+    namestot = sorted(list(set(namestot_raw)))
+    print('Log reading')
+    log = build_log(cwd / 'NamesLog.txt')
+    try:
+        if reboot:
+            log.reset()
+        if '' not in log:
+            log.append('\nname is empty\n' + str(datetime.now()) + '\n = UNK')
+
+        print('Names treatment')
+        # Keeping only names that are not in log file in namesfil
+        lognames = log.names()
+        namesfil = [name for name in namestot if name not in lognames]
+
+        print('Fetching names data from Wikipedia')
+        if engine == 'async':
+            from async_fetch import API_URL, async_engine
+            pool = async_engine(api_url or API_URL, concurrency)
+        else:
+            # tn = cpu_count()
+            # Since the bottleneck is waiting for the wikipedia server to
+            # ping back, n_pool should be as high as possible
+            n_pool = 25
+            pool = Pool(n_pool)
+        with pool:
+            if engine == 'async':
+                results = pool.imap_unordered(namesfil)
+            else:
+                results = pool.imap_unordered(name_to_gender, namesfil)
+            with tqdm(total=len(namesfil)) as pbar:
+                for gender, log_data in results:
+                    pbar.update()
+                    log.append(log_data)
+        if engine == 'async' and pool.failed:
+            print('%i names could not be fetched and will be fetched at the '
+                  'next run: %r' % (len(pool.failed), pool.failed[0][1]))
+
+        print('Saving out file in ' + names_out_path.name)
+        names_text = None
+        if incremental and names_out_path.is_file():
+            try:
+                names_text = read_sorted_names(names_out_path)
+            except ValueError:
+                print(names_out_path.name + ' is not sorted by name, '
+                      'writing it again')
+        if names_text is not None:
+            new_names = missing_names(names_text, namestot)
+            n_merged = merge_names_out(names_out_path,
+                                       log.genders(new_names),
+                                       names_text=names_text)
+            print('%i names merged in %s' % (n_merged, names_out_path.name))
+        else:
+            if incremental:
+                names_out = namestot
+            else:
+                names_out = namestot_raw
+            gender_data = log.genders()
+            # Names that could not be fetched are left out, and are added
+            # by the next run
+            unfetched = {name for name in names_out
+                         if name not in gender_data}
+            if unfetched:
+                print('%i names without a result left out of %s' %
+                      (len(unfetched), names_out_path.name))
+            write_names_text(names_out_path,
+                             [name + '\t' + gender_data[name]
+                              for name in names_out
+                              if name in gender_data])
+            snap_path = compile_snapshot(names_out_path)
+            print(names_out_path.name + ' compiled in ' + snap_path.name)
+        evidence_path = cwd / EVIDENCE_NAME
+        evidence = None
+        if incremental and not reboot and evidence_path.is_file():
+            try:
+                evidence = load_evidence(evidence_path)
+            except ValueError:
+                pass
+        if evidence is not None:
+            # Only the records of the names that are not in the evidence
+            # store yet are parsed
+            stored = set(evidence_names(evidence))
+            update_evidence(log.entries([name for name in log.names()
+                                         if name not in stored]),
+                            evidence_path, evidence)
+        else:
+            write_evidence(log.entries(), evidence_path)
+        print('Pages evidence saved in ' + EVIDENCE_NAME)
+        log.compact()
+    finally:
+        log.close()
+    print('Done')
+
+
+if __name__ == '__main__':
+    # build_dataset()
+    pass
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Evidence store of the Wikipedia searches of build_dataset(), so that the
+genders of NamesOut.txt can be recomputed with other thresholds without
+fetching the pages again.
+
+name_to_gender() writes, for each page it analysed, a line of pronoun counts
+in the log record of the name (he, his, she and her for the pages of
+method 1, men, male, women and female for the search listing of method 2).
+write_evidence() parses those records into a columnar .npz file, and
+update_evidence() adds the records of new names to it:
+    - the names, as a utf-8 blob and offsets
+    - the kind of each name (searched, empty or initials), its gender in
+      the log, the number of methods tried and their votes (genh and genf)
+    - the method and the 4 counts of each analysed page, in the order of the
+      analysis, indexed by name with page_offsets
+reclassify() recomputes the votes of each page and each name with numpy for
+new thresholds, and write_names_out() writes the corresponding NamesOut.txt.
+
+Two limits of the searches are kept by reclassify(), which flags the names
+whose evidence is incomplete for the new thresholds:
+    - method 1 stopped at max_votes votes, so when fewer pages vote with
+      the new thresholds, the pages that would have been analysed next were
+      never fetched
+    - method 2 was only tried when method 1 gave UNK, so a name that is UNK
+      with method 1 for the new thresholds may have no method 2 evidence
+"""
+
+import re
+import numpy as np
+from pathlib import Path
+from names_index import GENDERS, compile_snapshot, write_names_text
+from compressed_io import open_text
+
+EVIDENCE_VERSION = 1
+EVIDENCE_NAME = 'NamesEvidence.npz'
+
+# Kinds of names
+SEARCHED = 0
+EMPTY = 1
+INITIALS = 2
+
+# Thresholds of name_to_gender(): a page votes for a gender when its counts
+# are at least page_ratio times the ones of the other gender, a name is of
+# a gender when its votes are at least name_ratio times the ones of the
+# other gender, and the analysis stops after max_votes votes
+PAGE_RATIO = 3
+NAME_RATIO = 3
+MAX_VOTES = 20
+
+_COUNTS = {'he=': 1, 'men=': 2}
+_VOTES = re.compile(r' = (\d+)H (\d+)F$')
+
+
+def parse_record(record):
+    """Parses the log record of a name written by name_to_gender().
+
+    Returns
+    -------
+    tuple
+        (kind, tries, votes, pages) with the kind of name (SEARCHED, EMPTY
+        or INITIALS), the number of methods tried, the list of (genh, genf)
+        of each method tried, and the list of (method, count1, count2,
+        count3, count4) of each page analysed.
+    """
+    lines = record.split('\n')
+    if len(lines) >= 2 and lines[1] == 'name is empty':
+        return EMPTY, 0, [], []
+    if len(lines) >= 2 and lines[1] == 'name is initials':
+        return INITIALS, 0, [], []
+    votes = []
+    pages = []
+    for line in lines[1:]:
+        for prefix, method in _COUNTS.items():
+            if line.startswith(prefix):
+                counts = [int(count.split('=')[1])
+                          for count in line.split()]
+                pages.append((method,) + tuple(counts))
+                break
+        else:
+            vote = _VOTES.search(line)
+            if vote is not None:
+                votes.append((int(vote.group(1)), int(vote.group(2))))
+    return SEARCHED, len(votes), votes, pages
+
+
+def _evidence_arrays(datalog):
+    "Arrays of the evidence store of log records sorted by name"
+    n = len(datalog)
+    name_bytes = [d[0].encode('utf-8') for d in datalog]
+    name_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in name_bytes], out=name_offsets[1:])
+    kind = np.zeros(n, dtype=np.uint8)
+    gender = np.zeros(n, dtype=np.uint8)
+    tries = np.zeros(n, dtype=np.uint8)
+    votes = np.zeros((n, 2, 2), dtype=np.uint16)
+    page_offsets = np.zeros(n + 1, dtype=np.int64)
+    page_method = []
+    page_counts = []
+    for i, (name, gend, time, record) in enumerate(datalog):
+        gender[i] = GENDERS.index(gend) if gend in GENDERS else \
+            GENDERS.index('UNK')
+        kind[i], tries[i], name_votes, pages = parse_record(record)
+        for method, name_vote in enumerate(name_votes[:2]):
+            votes[i, method] = name_vote
+        for page in pages:
+            page_method.append(page[0])
+            page_counts.append(page[1:])
+        page_offsets[i+1] = len(page_method)
+    return {'version': np.array(EVIDENCE_VERSION),
+            'name_blob': np.frombuffer(b''.join(name_bytes), dtype=np.uint8),
+            'name_offsets': name_offsets,
+            'kind': kind,
+            'gender': gender,
+            'tries': tries,
+            'votes': votes,
+            'page_offsets': page_offsets,
+            'page_method': np.array(page_method, dtype=np.uint8),
+            'page_counts': np.array(page_counts,
+                                    dtype=np.uint32).reshape(-1, 4)}
+
+
+def write_evidence(datalog, path):
+    """Writes the evidence store of the log records of build_dataset().
+
+    Parameters
+    ----------
+    datalog: list
+        [name, gender, time, record] of each name, as returned by
+        lectdatalog().
+
+    path: str or Path
+        Path of the .npz file.
+
+    Returns
+    -------
+    int
+        Number of names written.
+    """
+    datalog = sorted(datalog, key=lambda d: d[0])
+    np.savez(path, **_evidence_arrays(datalog))
+    return len(datalog)
+
+
+def _select_ragged(offsets, rows):
+    "Indices of the items of the rows of a ragged array, and their offsets"
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    items = np.arange(new_offsets[-1]) + np.repeat(starts - new_offsets[:-1],
+                                                   lengths)
+    return items, new_offsets
+
+
+def update_evidence(datalog, path, evidence=None):
+    """Adds the log records of names to an evidence store written by
+    write_evidence(), replacing the ones of the names already in it. Only
+    the new records are parsed.
+
+    Parameters
+    ----------
+    datalog: list
+        [name, gender, time, record] of each name to add.
+
+    path: str or Path
+        Path of the .npz file, which is written again.
+
+    evidence: dict, optional
+        The evidence store of path, if it was already loaded by
+        load_evidence(). Default is None.
+
+    Returns
+    -------
+    int
+        Number of names in the evidence store.
+    """
+    if evidence is None:
+        evidence = load_evidence(path)
+    datalog = sorted(datalog, key=lambda d: d[0])
+    new = _evidence_arrays(datalog)
+    new_names = [d[0] for d in datalog]
+    replaced = set(new_names)
+    names = evidence_names(evidence)
+    n_old = len(names)
+    # Rows of the old store then of the new one, sorted by name
+    rows = [i for i, name in enumerate(names) if name not in replaced]
+    rows += range(n_old, n_old + len(new_names))
+    names += new_names
+    rows = np.array(sorted(rows, key=names.__getitem__), dtype=np.int64)
+
+    merged = {'version': np.array(EVIDENCE_VERSION)}
+    for key in ['kind', 'gender', 'tries', 'votes']:
+        merged[key] = np.concatenate([evidence[key], new[key]])[rows]
+    name_offsets = np.concatenate([
+        evidence['name_offsets'][:-1],
+        evidence['name_offsets'][-1] + new['name_offsets']])
+    items, merged['name_offsets'] = _select_ragged(name_offsets, rows)
+    merged['name_blob'] = np.concatenate([evidence['name_blob'],
+                                          new['name_blob']])[items]
+    page_offsets = np.concatenate([
+        evidence['page_offsets'][:-1],
+        evidence['page_offsets'][-1] + new['page_offsets']])
+    items, merged['page_offsets'] = _select_ragged(page_offsets, rows)
+    for key in ['page_method', 'page_counts']:
+        merged[key] = np.concatenate([evidence[key], new[key]])[items]
+    np.savez(path, **merged)
+    return len(rows)
+
+
+def load_evidence(path):
+    "Loads an evidence store written by write_evidence() as a dict of arrays"
+    with np.load(path) as data:
+        evidence = {key: data[key] for key in data.files}
+    if int(evidence['version']) != EVIDENCE_VERSION:
+        raise ValueError('Unsupported evidence store version %i' %
+                         int(evidence['version']))
+    return evidence
+
+
+def evidence_names(evidence):
+    "List of the names of an evidence store"
+    blob = evidence['name_blob'].tobytes()
+    offsets = evidence['name_offsets'].tolist()
+    return [blob[offsets[i]:offsets[i+1]].decode('utf-8')
+            for i in range(len(offsets) - 1)]
+
+
+def _name_gender(genh, genf, name_ratio):
+    "Gender codes of names from their votes, like name_to_gender()"
+    gender = np.full(len(genh), GENDERS.index('UNK'), dtype=np.uint8)
+    gender[(genh > 0) | (genf > 0)] = GENDERS.index('UNI')
+    gender[(genf >= name_ratio * genh) & (genf > 0)] = GENDERS.index('F')
+    gender[(genh >= name_ratio * genf) & (genh > 0)] = GENDERS.index('M')
+    return gender
+
+
+def reclassify(evidence,
+               page_ratio=PAGE_RATIO,
+               name_ratio=NAME_RATIO,
+               max_votes=MAX_VOTES):
+    """Recomputes the genders of the names of an evidence store for new
+    thresholds.
+
+    Parameters
+    ----------
+    evidence: dict
+        Evidence store returned by load_evidence().
+
+    page_ratio: float, optional
+        A page votes for a gender if its counts for this gender are at
+        least page_ratio times the ones of the other gender. Default is 3.
+
+    name_ratio: float, optional
+        A name is of a gender if the votes of its pages for this gender are
+        at least name_ratio times the ones for the other gender, and UNI if
+        it has votes otherwise. Default is 3.
+
+    max_votes: int, optional
+        The analysis of the pages of a method stops after max_votes votes.
+        It cannot be above the one of the log (20). Default is 20.
+
+    Returns
+    -------
+    tuple of arrays
+        The gender code of each name (index in GENDERS), and whether the
+        evidence of the name is complete for the new thresholds.
+    """
+    n = len(evidence['kind'])
+    method = evidence['page_method'].astype(np.int64)
+    counts = evidence['page_counts'].astype(np.int64)
+    male = counts[:, 0] + counts[:, 1]
+    female = counts[:, 2] + counts[:, 3]
+    male_vote = (male >= page_ratio * female) & (male > 0)
+    female_vote = ~male_vote & (female >= page_ratio * male) & (female > 0)
+
+    # Group of each page: 2 groups per name, one per method
+    page_name = np.repeat(np.arange(n), np.diff(evidence['page_offsets']))
+    group = 2 * page_name + method - 1
+    # Votes before each page in its group, so that the pages after the
+    # max_votes-th vote are ignored
+    vote = (male_vote | female_vote).astype(np.int64)
+    cum_votes = np.cumsum(vote)
+    if len(group):
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        group_start_votes = np.repeat(cum_votes[starts] - vote[starts],
+                                      np.diff(np.r_[starts, len(group)]))
+        votes_before = cum_votes - vote - group_start_votes
+    else:
+        votes_before = cum_votes
+    counted = votes_before < max_votes
+    genh = np.bincount(group[counted & male_vote],
+                       minlength=2*n).reshape(n, 2)
+    genf = np.bincount(group[counted & female_vote],
+                       minlength=2*n).reshape(n, 2)
+
+    gender1 = _name_gender(genh[:, 0], genf[:, 0], name_ratio)
+    gender2 = _name_gender(genh[:, 1], genf[:, 1], name_ratio)
+    unk = GENDERS.index('UNK')
+    gender = np.where(gender1 == unk, gender2, gender1)
+
+    # Method 1 was stopped at MAX_VOTES votes in the log: the next pages are
+    # missing if the new thresholds give fewer votes
+    logged_votes = evidence['votes'].astype(np.int64)
+    stopped = logged_votes[:, 0].sum(axis=1) >= MAX_VOTES
+    exact = ~(stopped & (genh[:, 0] + genf[:, 0] < max_votes))
+    # Method 2 is needed but was not tried
+    tries = evidence['tries']
+    exact &= ~((gender1 == unk) & (tries < 2))
+
+    kind = evidence['kind']
+    searched = kind == SEARCHED
+    gender = np.where(searched, gender, evidence['gender'])
+    exact |= ~searched
+    return gender.astype(np.uint8), exact
+
+
+def write_names_out(evidence_path,
+                    output_path,
+                    names_path=None,
+                    page_ratio=PAGE_RATIO,
+                    name_ratio=NAME_RATIO,
+                    max_votes=MAX_VOTES):
+    """Writes a NamesOut.txt file with the genders recomputed by reclassify()
+    for new thresholds, and compiles its snapshot.
+
+    Parameters
+    ----------
+    evidence_path: str or Path
+        Path of the evidence store written by build_dataset().
+
+    output_path: str or Path
+        Path of the NamesOut.txt file, which can be compressed.
+
+    names_path: str or Path, optional
+        Names.txt file whose names are written, in the same order, like
+        build_dataset(). The names that are not in the evidence store are
+        left out. If None, the names of the evidence store are written in
+        alphabetical order. Default is None.
+
+    page_ratio, name_ratio, max_votes: optional
+        Thresholds, see reclassify().
+
+    Returns
+    -------
+    int
+        Number of names whose evidence is incomplete for the thresholds.
+    """
+    evidence = load_evidence(evidence_path)
+    gender, exact = reclassify(evidence, page_ratio, name_ratio, max_votes)
+    names = evidence_names(evidence)
+    labels = [GENDERS[code] for code in gender.tolist()]
+    gender_data = dict(zip(names, labels))
+    if names_path is None:
+        names_raw = names
+    else:
+        with open_text(names_path) as namefile:
+            names_raw = namefile.read().split('\n')
+        if names_raw[-1] == '':
+            names_raw.pop()
+    # Names without evidence, which build_dataset() could not fetch, are
+    # left out like in build_dataset()
+    unfetched = {name for name in names_raw if name not in gender_data}
+    if unfetched:
+        print('%i names without evidence left out of %s' %
+              (len(unfetched), Path(output_path).name))
+    lines = [name + '\t' + gender_data[name]
+             for name in names_raw if name in gender_data]
+    write_names_text(output_path, lines)
+    compile_snapshot(Path(output_path))
+    n_inexact = int((~exact).sum())
+    print('Genders of %i names written in %s' %
+          (len(lines), Path(output_path).name))
+    if n_inexact:
+        print('%i names have incomplete evidence for these thresholds' %
+              n_inexact)
+    return n_inexact
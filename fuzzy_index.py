@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Approximate lookup of name tokens that are not in the names database, for
+misspellings and transliteration variants of known names.
+
+fuzzy_index is a symmetric delete index: each name of the database is
+indexed under itself and all the strings obtained by deleting up to
+max_distance of its characters. A token is looked up with its own deletes,
+and the candidates are verified with the edit distance, so that all the
+names within max_distance edits (insertions, deletions, substitutions and
+transpositions of adjacent characters) are found.
+
+To keep the index compact, the deletes are not stored: each entry is a
+64 bits integer made of the hash of a delete and of the index of its name,
+in a sorted array searched by bisection.
+"""
+
+import sys
+from array import array
+from bisect import bisect_left
+
+# Genders of the names that are indexed
+FUZZY_GENDERS = ('M', 'F', 'UNI')
+
+
+def deletes(word, max_distance):
+    """Set of word and of the strings obtained by deleting up to
+    max_distance characters of word"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i+1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def _distance_one(a, b):
+    """edit_distance(a, b, 1), comparing the ends of the strings after
+    their first difference"""
+    if a == b:
+        return 0
+    len_a = len(a)
+    len_b = len(b)
+    if abs(len_a - len_b) > 1:
+        return 2
+    i = 0
+    n = min(len_a, len_b)
+    while i < n and a[i] == b[i]:
+        i += 1
+    if len_a == len_b:
+        if a[i+1:] == b[i+1:]:
+            return 1
+        if a[i] == b[i+1] and a[i+1] == b[i] and a[i+2:] == b[i+2:]:
+            return 1
+        return 2
+    if len_a > len_b:
+        return 1 if a[i+1:] == b[i:] else 2
+    return 1 if a[i:] == b[i+1:] else 2
+
+
+def edit_distance(a, b, max_distance=None):
+    """Number of insertions, deletions, substitutions and transpositions of
+    adjacent characters to change a into b (optimal string alignment
+    distance).
+
+    If max_distance is given, max_distance + 1 is returned as soon as the
+    distance is known to be above max_distance.
+    """
+    if max_distance == 1:
+        return _distance_one(a, b)
+    if max_distance is None:
+        max_distance = max(len(a), len(b))
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before = previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous, row = row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i-1] != b[j-1]
+            row[j] = min(previous[j] + 1,
+                         row[j-1] + 1,
+                         previous[j-1] + cost)
+            if (i > 1 and j > 1 and a[i-1] == b[j-2] and
+                    a[i-2] == b[j-1]):
+                row[j] = min(row[j], before[j-2] + 1)
+        if min(row) > max_distance:
+            return max_distance + 1
+        before = previous
+    return min(row[-1], max_distance + 1)
+
+
+def _sorted_array(values):
+    """Sorted array of int64 of a list of integers, sorted and deduplicated
+    with numpy if it is installed, which is several times faster"""
+    try:
+        import numpy as np
+    except ImportError:
+        values.sort()
+        return array('q', values)
+    values = np.array(values, dtype=np.int64)
+    values.sort()
+    if len(values) > 1:
+        # np.unique() is much slower than sorting and masking
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    sorted_values = array('q')
+    sorted_values.frombytes(values.tobytes())
+    return sorted_values
+
+
+class fuzzy_index():
+    """Approximate lookup index of the names of a names database that have
+    the gender M, F or UNI.
+
+    Parameters
+    ----------
+    names_key: dict or names_table
+        The names database, name token to gender.
+
+    max_distance: int, optional
+        Maximum edit distance of the matches. The size of the index grows
+        quickly with it. Default is 1.
+    """
+
+    def __init__(self, names_key, max_distance=1):
+        self.max_distance = max_distance
+        self.names = []
+        self.genders = []
+        for name, gend in names_key.items():
+            if gend in FUZZY_GENDERS:
+                self.names.append(name)
+                self.genders.append(gend)
+        self._words = [name.lower() for name in self.names]
+        self._index_bits = max(1, (len(self.names) - 1).bit_length())
+        self._hash_mask = (1 << (63 - self._index_bits)) - 1
+        index_bits = self._index_bits
+        hash_mask = self._hash_mask
+        if max_distance == 1:
+            # Faster, with the word itself as the delete after its end.
+            # Words with doubled letters get duplicate entries, which are
+            # harmless.
+            entries = [((hash(word[:j] + word[j+1:]) & hash_mask)
+                        << index_bits) | i
+                       for i, word in enumerate(self._words)
+                       for j in range(len(word) + 1)]
+        else:
+            entries = [((hash(variant) & hash_mask) << index_bits) | i
+                       for i, word in enumerate(self._words)
+                       for variant in deletes(word, max_distance)]
+        self.entries = _sorted_array(entries)
+
+    def candidates(self, word):
+        "Indices of the names sharing a delete with word (lowercase)"
+        entries = self.entries
+        index_bits = self._index_bits
+        index_mask = (1 << index_bits) - 1
+        found = set()
+        for variant in deletes(word, self.max_distance):
+            key = (hash(variant) & self._hash_mask) << index_bits
+            i = bisect_left(entries, key)
+            while i < len(entries) and entries[i] >> index_bits == \
+                    key >> index_bits:
+                found.add(entries[i] & index_mask)
+                i += 1
+        return found
+
+    def find(self, token):
+        """Closest names of a name token, case insensitive.
+
+        Returns
+        -------
+        tuple or None
+            (name, gender, distance) of the closest name, or None if no name
+            is within max_distance edits. If several names are at the same
+            distance, the first one in alphabetical order is returned, with
+            their gender if they all have the same, and UNI otherwise.
+        """
+        word = token.lower()
+        best = []
+        best_distance = self.max_distance + 1
+        for i in self.candidates(word):
+            distance = edit_distance(word, self._words[i], self.max_distance)
+            if distance < best_distance:
+                best = [i]
+                best_distance = distance
+            elif distance == best_distance and distance <= self.max_distance:
+                best.append(i)
+        if not best:
+            return None
+        best.sort(key=self.names.__getitem__)
+        genders = {self.genders[i] for i in best}
+        gend = genders.pop() if len(genders) == 1 else 'UNI'
+        return self.names[best[0]], gend, best_distance
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        "Approximate memory of the index, in bytes"
+        return (self.entries.itemsize * len(self.entries) +
+                sum(map(sys.getsizeof, self.names)) +
+                sum(map(sys.getsizeof, self._words)) +
+                8 * 3 * len(self.names))
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Command line interface of Wiki-Gendersort, installed as the wiki-gendersort
+command by setup.py, or run with python gendersort_cli.py.
+
+wiki-gendersort assign [files] reads first names separated by line breaks
+from the files (which can be compressed) or from the standard input, and
+writes name<tab>gender lines on the standard output, in the same order.
+For example:
+
+    zcat authors.txt.gz | wiki-gendersort assign | sort > genders.txt
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+from pathlib import Path
+
+# Size of the buffers of the standard input and output
+BUFFER_SIZE = 2**20
+
+
+def _format_lines(names, genders, output_format):
+    "Output lines of a batch of names and their genders"
+    if output_format == 'csv':
+        lines = _csv_lines()
+        lines.writer.writerows(zip(names, genders))
+        return lines.getvalue()
+    if output_format == 'jsonl':
+        return ''.join([json.dumps({'name': name, 'gender': gender},
+                                   ensure_ascii=False) + '\n'
+                        for name, gender in zip(names, genders)])
+    return ''.join([name + '\t' + gender + '\n'
+                    for name, gender in zip(names, genders)])
+
+
+class _csv_lines():
+    "csv.writer writing in a list of strings"
+
+    def __init__(self):
+        self.lines = []
+        self.writer = csv.writer(self, lineterminator='\n')
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def getvalue(self):
+        return ''.join(self.lines)
+
+
+def _assign_batch(names):
+    """Genders and unknown name tokens of a batch of names, in a process
+    attached to the names database"""
+    import Wiki_Gendersort
+    result = Wiki_Gendersort._file_worker.assign_many(names)
+    labels = result.labels
+    return [labels[gend] for gend in result.genders], result.unknown
+
+
+def _batches(paths, batch_size):
+    "Lists of batch_size names read from the files, or the standard input"
+    from compressed_io import detect_compression, open_text
+    for path in paths:
+        if path == '-':
+            infile = open(sys.stdin.fileno(), 'r', buffering=BUFFER_SIZE,
+                          encoding='utf-8', closefd=False)
+        else:
+            compression = detect_compression(path)
+            infile = open_text(path, compression=compression,
+                               prefetch=compression is not None)
+        with infile:
+            while True:
+                names = [line.replace('\n', '')
+                         for line in islice(infile, batch_size)]
+                if not names:
+                    break
+                yield names
+
+
+def _assigned_batches(WG, batches, workers):
+    """Genders and unknown name tokens of each batch of names, in order,
+    assigned by WG or by a pool of workers processes"""
+    if workers <= 1:
+        for names in batches:
+            result = WG.assign_many(names)
+            labels = result.labels
+            yield names, [labels[gend] for gend in result.genders], \
+                result.unknown
+        return
+
+    for names, (genders, unknown) in WG._worker_imap(_assign_batch, batches,
+                                                     workers):
+        yield names, genders, unknown
+
+
+def assign(args):
+    "wiki-gendersort assign: writes the genders of the names on stdout"
+    from Wiki_Gendersort import wiki_gendersort, unknown_tokens
+
+    if args.snapshot == 'compact':
+        WG = wiki_gendersort(args.database, backend='compact',
+                             fuzzy_distance=args.fuzzy_distance)
+    else:
+        WG = wiki_gendersort(args.database, snapshot=args.snapshot == 'on',
+                             fuzzy_distance=args.fuzzy_distance)
+    newnames = None
+    if args.unknown is not None:
+        newnames = unknown_tokens(temp_dir=Path(args.unknown).parent)
+
+    outfile = open(sys.stdout.fileno(), 'w', buffering=BUFFER_SIZE,
+                   encoding='utf-8', newline='\n', closefd=False)
+    with outfile:
+        if args.format == 'csv':
+            outfile.write('name,gender\n')
+        batches = _batches(args.files or ['-'], args.batch_size)
+        for names, genders, unknown in _assigned_batches(WG, batches,
+                                                         args.workers):
+            outfile.write(_format_lines(names, genders, args.format))
+            if newnames is not None:
+                newnames.update(unknown)
+    if newnames is not None:
+        newnames.write(args.unknown)
+    return 0
+
+
+def serve(args):
+    "wiki-gendersort serve: runs the HTTP server of gendersort_server.py"
+    from gendersort_server import serve as serve_http
+    serve_http(args.database, args.host, args.port, args.window,
+               args.max_batch, args.backend, args.verbose,
+               args.fuzzy_distance)
+    return 0
+
+
+def parser():
+    "Parser of the command line arguments"
+    main_parser = argparse.ArgumentParser(
+        prog='wiki-gendersort',
+        description='Gender assignment of first names with Wiki-Gendersort')
+    subparsers = main_parser.add_subparsers(dest='command', required=True)
+
+    assign_parser = subparsers.add_parser(
+        'assign',
+        help='assign genders to first names, one per line',
+        description='Reads first names separated by line breaks from the '
+                    'files (which can be compressed with gzip, bz2, xz or '
+                    'zstd) or from the standard input, and writes their '
+                    'genders on the standard output, in the same order.')
+    assign_parser.add_argument(
+        'files', nargs='*',
+        help='files of first names, - for the standard input (default)')
+    assign_parser.add_argument(
+        '--format', choices=['tsv', 'csv', 'jsonl'], default='tsv',
+        help='output format: name<tab>gender lines (default), CSV with a '
+             'header, or JSON lines')
+    assign_parser.add_argument(
+        '--workers', type=int, default=1,
+        help='number of processes assigning genders (default 1)')
+    assign_parser.add_argument(
+        '--snapshot', choices=['on', 'off', 'compact'], default='on',
+        help='on: load the names database from its binary snapshot '
+             '(default); off: parse the text file; compact: use the '
+             'memory-mapped snapshot directly, which starts fastest but '
+             'has slower lookups')
+    assign_parser.add_argument(
+        '--database', default=None,
+        help='names database, NamesOut.txt or its .snap snapshot '
+             '(default: NamesOut.txt next to Wiki_Gendersort.py)')
+    assign_parser.add_argument(
+        '--unknown', default=None,
+        help='file where the unknown name tokens are written')
+    assign_parser.add_argument(
+        '--batch-size', type=int, default=10000,
+        help='number of names assigned at once (default 10000)')
+    assign_parser.add_argument(
+        '--fuzzy-distance', type=int, default=0,
+        help='match the unknown name tokens to known names within this '
+             'edit distance (default 0, disabled)')
+    assign_parser.set_defaults(function=assign)
+
+    serve_parser = subparsers.add_parser(
+        'serve',
+        help='run a local HTTP server assigning genders',
+        description='Loads the names database once and answers '
+                    'GET /assign?name=... and POST /assign_many requests '
+                    'with JSON, batching concurrent requests together.')
+    serve_parser.add_argument(
+        '--host', default='127.0.0.1',
+        help='address of the server (default 127.0.0.1)')
+    serve_parser.add_argument(
+        '--port', type=int, default=8000,
+        help='port of the server, 0 for any free port (default 8000)')
+    serve_parser.add_argument(
+        '--window', type=float, default=0.001,
+        help='seconds waited for concurrent requests to batch together '
+             '(default 0.001)')
+    serve_parser.add_argument(
+        '--max-batch', type=int, default=10000,
+        help='maximum number of names of a batch (default 10000)')
+    serve_parser.add_argument(
+        '--backend', choices=['dict', 'compact'], default='dict',
+        help='storage of the names database (default dict)')
+    serve_parser.add_argument(
+        '--database', default=None,
+        help='names database, NamesOut.txt or its .snap snapshot '
+             '(default: NamesOut.txt next to Wiki_Gendersort.py)')
+    serve_parser.add_argument(
+        '--verbose', action='store_true',
+        help='print each request')
+    serve_parser.add_argument(
+        '--fuzzy-distance', type=int, default=0,
+        help='match the unknown name tokens to known names within this '
+             'edit distance (default 0, disabled)')
+    serve_parser.set_defaults(function=serve)
+    return main_parser
+
+
+def main(argv=None):
+    """Runs the command line interface.
+
+    Parameters
+    ----------
+    argv: list of str, optional
+        Command line arguments. If None, sys.argv[1:] is used.
+        Default is None.
+
+    Returns
+    -------
+    int
+        Exit status.
+    """
+    args = parser().parse_args(argv)
+    try:
+        return args.function(args)
+    except BrokenPipeError:
+        # The output was closed early, like with | head
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Local HTTP server of Wiki-Gendersort, which loads the names database once
+for several applications. Run it with serve(), or with
+
+    wiki-gendersort serve --port 8000
+
+Endpoints, which return JSON:
+
+    GET /assign?name=Nicolas
+        {"name": "Nicolas", "gender": "M", "matched_name": "Nicolas",
+         "fuzzy": false}
+        With several name parameters, a list of results is returned.
+
+    POST /assign_many with a JSON list of first names as body
+        List of results, in the same order.
+
+    GET /stats
+        Number of requests, names and batches assigned.
+
+The names of the requests arriving within a short window are assigned
+together in one wiki_gendersort.assign_many() batch.
+"""
+
+import json
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter
+from urllib.parse import parse_qs, urlsplit
+
+
+class request_batcher():
+    """Assigns the names of concurrent requests in batches, in a background
+    thread.
+
+    Parameters
+    ----------
+    WG: wiki_gendersort
+        The gender assigner.
+
+    window: float, optional
+        Time waited for other requests after the first one of a batch,
+        in seconds. With 0, only the requests already waiting are batched
+        together. Default is 0.001.
+
+    max_batch: int, optional
+        Maximum number of names of a batch. Default is 10000.
+    """
+
+    def __init__(self, WG, window=0.001, max_batch=10000):
+        self.WG = WG
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {'requests': 0, 'names': 0, 'batches': 0}
+        self._lock = Lock()
+        self._queue = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, names):
+        """Returns a Future of the list of results (dicts with the name,
+        gender, matched_name and fuzzy) of a list of first names"""
+        future = Future()
+        self._queue.put((names, future))
+        return future
+
+    def assign(self, names, timeout=None):
+        "List of results of a list of first names"
+        return self.submit(names).result(timeout)
+
+    def _next_batch(self):
+        "Waiting requests, after at most window seconds, or None at the end"
+        request = self._queue.get()
+        if request is None:
+            return None
+        batch = [request]
+        n_names = len(request[0])
+        deadline = perf_counter() + self.window
+        while n_names < self.max_batch:
+            try:
+                timeout = deadline - perf_counter()
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except Empty:
+                break
+            if request is None:
+                # Stops after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+            n_names += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            names = [name for request_names, _ in batch
+                     for name in request_names]
+            try:
+                result = self.WG.assign_many(names)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            labels = result.labels
+            tokens = result.tokens
+            results = [{'name': name,
+                        'gender': labels[gend],
+                        'matched_name': None if match < 0 else tokens[match],
+                        'fuzzy': bool(fuzzy)}
+                       for name, gend, match, fuzzy in zip(names,
+                                                           result.genders,
+                                                           result.matched,
+                                                           result.fuzzy)]
+            i = 0
+            for request_names, future in batch:
+                future.set_result(results[i:i+len(request_names)])
+                i += len(request_names)
+            with self._lock:
+                self.stats['requests'] += len(batch)
+                self.stats['names'] += len(names)
+                self.stats['batches'] += 1
+
+    def close(self):
+        "Stops the background thread after the waiting requests"
+        self._queue.put(None)
+        self._thread.join()
+
+
+class _handler(BaseHTTPRequestHandler):
+    "Requests of gendersort_server"
+    # Keep-alive connections, without waiting for the acknowledgement of
+    # the headers before sending the body
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/assign':
+            names = parse_qs(url.query, keep_blank_values=True).get('name')
+            if not names:
+                self._send_json(400, {'error': 'Missing name parameter'})
+                return
+            results = self.server.batcher.assign(names)
+            self._send_json(200, results[0] if len(results) == 1
+                            else results)
+        elif url.path == '/stats':
+            with self.server.batcher._lock:
+                self._send_json(200, dict(self.server.batcher.stats))
+        else:
+            self._send_json(404, {'error': 'Unknown path ' + url.path})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if url.path != '/assign_many':
+            self._send_json(404, {'error': 'Unknown path ' + url.path})
+            return
+        try:
+            names = json.loads(body)
+        except ValueError:
+            names = None
+        if (not isinstance(names, list) or
+                not all(isinstance(name, str) for name in names)):
+            self._send_json(400, {'error': 'The body should be a JSON list '
+                                           'of first names'})
+            return
+        self._send_json(200, self.server.batcher.assign(names)
+                        if names else [])
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class gendersort_server(ThreadingHTTPServer):
+    """HTTP server assigning genders with a wiki_gendersort, each request
+    being handled in its own thread.
+
+    Parameters
+    ----------
+    WG: wiki_gendersort
+        The gender assigner.
+
+    host: str, optional
+        Address of the server. Default is '127.0.0.1'.
+
+    port: int, optional
+        Port of the server. 0 chooses a free port, given by
+        server_address. Default is 8000.
+
+    window: float, optional
+        Time waited for other requests to batch together, in seconds.
+        Default is 0.001.
+
+    max_batch: int, optional
+        Maximum number of names of a batch. Default is 10000.
+
+    verbose: bool, optional
+        Prints each request. Default is False.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self,
+                 WG,
+                 host='127.0.0.1',
+                 port=8000,
+                 window=0.001,
+                 max_batch=10000,
+                 verbose=False):
+        super().__init__((host, port), _handler)
+        self.verbose = verbose
+        self.batcher = request_batcher(WG, window, max_batch)
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+
+def serve(input_path=None,
+          host='127.0.0.1',
+          port=8000,
+          window=0.001,
+          max_batch=10000,
+          backend='dict',
+          verbose=False,
+          fuzzy_distance=0):
+    """Loads the names database and serves gender assignment requests
+    until interrupted.
+
+    Parameters
+    ----------
+    input_path: str, optional
+        Path to the names database, like for wiki_gendersort().
+        Default is None.
+
+    host, port, window, max_batch, verbose:
+        Same as for gendersort_server. Default is '127.0.0.1', 8000, 0.001,
+        10000 and False.
+
+    backend: str, optional
+        'dict' or 'compact', like for wiki_gendersort(). Default is 'dict'.
+
+    fuzzy_distance: int, optional
+        Maximum edit distance of the approximate matches of unknown name
+        tokens, like for wiki_gendersort(). Default is 0.
+    """
+    from Wiki_Gendersort import wiki_gendersort
+
+    WG = wiki_gendersort(input_path, backend=backend,
+                         result_cache_size=10**5,
+                         fuzzy_distance=fuzzy_distance)
+    server = gendersort_server(WG, host, port, window, max_batch, verbose)
+    print('Serving on http://%s:%i' % server.server_address[:2], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
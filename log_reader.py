@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Reader of the NamesLog.txt build log of build_dataset(), shared by
+lectdatalog() and tables_for_article.table_compare().
+
+The log is a list of records separated by blank lines, written by
+name_to_gender(): the first line of a record is the name, the second to
+last its time, and the last one 'name = gender'. read_log() returns the
+latest record of each name.
+
+Large logs are memory-mapped and split into chunks ending on record
+boundaries, which are parsed by a pool of processes. The processes only
+return the position of the latest record of each name in their chunk, and
+the records are decoded from the memory map afterwards.
+"""
+
+import mmap
+import os
+from datetime import datetime
+
+# Below this size, the log is parsed in a single process
+_MIN_PARALLEL_SIZE = 2**26
+
+
+def log_records(f, chunk_size=2**24):
+    """Records of a log file separated by blank lines, read chunk_size
+    characters at a time. Same as f.read().split('\\n\\n')."""
+    rest = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        records = (rest + chunk).split('\n\n')
+        # The last record may continue in the next chunk
+        rest = records.pop()
+        yield from records
+    yield rest
+
+
+def log_time(time):
+    "Parses the time of a log record, written with str(datetime.now())"
+    # fromisoformat() is much faster than strptime() for the formats
+    # of str(datetime), with or without microseconds
+    if len(time) in (19, 26) and time[10] == ' ':
+        try:
+            return datetime.fromisoformat(time)
+        except ValueError:
+            pass
+    try:
+        return datetime.strptime(time, '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError:
+        return datetime.strptime(time, '%Y-%m-%d %H:%M:%S')
+
+
+def log_entry(record):
+    """(name, gender, time) of a log record, or None if it is not a complete
+    record, like the last record of a log cut by an interruption"""
+    ds = record.split('\n')
+    if len(ds) < 2:
+        return None
+    try:
+        time = log_time(ds[-2])
+    except ValueError:
+        return None
+    return ds[0], ds[-1].replace(' ', '').split('=')[-1], time
+
+
+def _read_log_text(log_path):
+    "read_log() in a single pass over the text of the log"
+    # Latest entry of each name, the first one in the file if several
+    # have the same time. The entries are tuples, which the garbage
+    # collector stops tracking.
+    latest = {}
+    with open(log_path, encoding='utf-8') as f:
+        for d in log_records(f):
+            if len(d) != 0:
+                parsed = log_entry(d)
+                if parsed is not None:
+                    name, gend, time = parsed
+                    entry = latest.get(name)
+                    if entry is None or entry[2] < time:
+                        latest[name] = (name, gend, time, d)
+    return latest
+
+
+def _record_boundary(data, start):
+    """Position of the first record after start, at the end of a blank line
+    separator, or len(data)"""
+    i = data.find(b'\n\n', start)
+    if i == -1:
+        return len(data)
+    # Run of k line breaks from i: split('\n\n') takes them 2 by 2, and a
+    # last odd line break begins the next record
+    while i > 0 and data[i-1] == 10:
+        i -= 1
+    k = 2
+    while i + k < len(data) and data[i+k] == 10:
+        k += 1
+    return i + 2 * (k // 2)
+
+
+def _parse_chunk(task):
+    """Latest record of each name between the bytes start and end of the
+    log, as name: (time, gender, record start, record end)"""
+    log_path, start, end, last = task
+    with open(log_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunk = data[start:end]
+    records = chunk.split(b'\n\n')
+    if not last:
+        # The chunk ends with a separator, which adds an empty record
+        records.pop()
+    latest = {}
+    pos = start
+    for d in records:
+        record_start = pos
+        pos += len(d) + 2
+        last_break = d.rfind(b'\n')
+        if last_break == -1:
+            continue
+        time_break = d.rfind(b'\n', 0, last_break)
+        name = d[:d.find(b'\n')].decode('utf-8')
+        gend = d[last_break+1:].decode('utf-8').replace(' ', '').split('=')[-1]
+        try:
+            time = log_time(d[time_break+1:last_break].decode('utf-8'))
+        except ValueError:
+            # Incomplete record
+            continue
+        entry = latest.get(name)
+        if entry is None or entry[0] < time:
+            latest[name] = (time, gend, record_start, record_start + len(d))
+    return latest
+
+
+def read_log(log_path, workers=None, chunk_size=2**26):
+    """Latest record of each name of a build log.
+
+    Parameters
+    ----------
+    log_path: str or Path
+        Path of the log, NamesLog.txt.
+
+    workers: int, optional
+        Number of processes parsing the log. If None, the number of CPUs.
+        Logs smaller than 64 MB are parsed in a single process.
+        Default is None.
+
+    chunk_size: int, optional
+        Approximate size of the chunks of the log given to each process,
+        in bytes. Default is 64 MB.
+
+    Returns
+    -------
+    dict
+        name: (name, gender, time, record) of the latest record of each
+        name, or of the first one in the log if several have the same time.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    size = os.path.getsize(log_path)
+    if size == 0:
+        return {}
+    with open(log_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data.find(b'\r') != -1:
+            # Line breaks other than \n are translated when reading text
+            return _read_log_text(log_path)
+        tasks = []
+        start = 0
+        while start < size:
+            end = size
+            if workers > 1 and size >= _MIN_PARALLEL_SIZE:
+                end = _record_boundary(data, min(start + chunk_size, size))
+            tasks.append((log_path, start, end, end == size))
+            start = end
+
+        if len(tasks) == 1:
+            results = [_parse_chunk(tasks[0])]
+        else:
+            from multiprocessing import Pool
+            with Pool(min(workers, len(tasks))) as pool:
+                results = pool.imap(_parse_chunk, tasks)
+                # Merged in the order of the log, so that the first record
+                # is kept for equal times
+                latest = {}
+                for chunk_latest in results:
+                    for name, entry in chunk_latest.items():
+                        current = latest.get(name)
+                        if current is None or current[0] < entry[0]:
+                            latest[name] = entry
+                results = [latest]
+        latest = results[0]
+        return {name: (name, gend, time,
+                       data[record_start:record_end].decode('utf-8'))
+                for name, (time, gend, record_start, record_end)
+                in latest.items()}
@@ -0,0 +1,693 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Storage of the Wiki-Gendersort names database.
+
+NamesOut.txt is a tab separated flat file that takes a few seconds to parse.
+compile_snapshot() compiles it into a versioned binary snapshot (NamesOut.snap)
+that is memory-mapped by wiki_gendersort() instead of parsing the text file.
+
+The snapshot contains, after a fixed header and the list of gender labels:
+    - the offsets of each key in the key blob (uint32, n+1 values)
+    - the gender code of each key (uint8, n values)
+    - the key blob, with the keys sorted and each followed by a line break
+The sha256 of the source NamesOut.txt is stored in the header, so a snapshot
+is regenerated automatically when the text file changes.
+
+merge_names_out() adds names to a NamesOut.txt sorted by name with a sorted
+merge, and inserts them in the arrays of its snapshot instead of compiling
+it again. Both files are replaced atomically, so they are still written
+again in full.
+
+publish_snapshot() writes a snapshot in shared memory, so that worker
+processes can all map the same copy of the names database.
+"""
+
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping
+from pathlib import Path
+from bisect import bisect_left
+from compressed_io import (open_bytes, open_text, strip_compression,
+                           suffix_compression)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = '.snap'
+GENDERS = ('M', 'F', 'UNI', 'UNK', 'INI')
+
+_MAGIC = b'WGSNAP\x00\x00'
+# magic, version, little endian flag, number of keys, blob length,
+# labels length, sha256 of the source file
+_HEADER = struct.Struct('<8sIB3xIQI32s')
+
+
+def name_key(name):
+    "Key of a name of the text file in the names database"
+    name = name.upper()
+    if name:
+        name = name[0] + name[1:].lower()
+    return name
+
+
+def _parse_names(filewg):
+    "names_key dict of the lines of a names database text file"
+    names_key = {}
+    for line in filewg.readlines():
+        ls = line.replace('\n', '').split('\t')
+        gend = ls[-1]
+        names_key[name_key('\t'.join(ls[0:-1]))] = gend
+    return names_key
+
+
+def read_names_text(input_path):
+    """Imports the names database from its text file into a dict.
+    The file can be compressed."""
+    with open_text(input_path) as filewg:
+        return _parse_names(filewg)
+
+
+def read_names_source(input_path):
+    """Imports the names database from its text file, and returns the sha256
+    digest of the file along with it.
+
+    The file is read once, and the digest and the names are computed from
+    the same bytes, so that they match even if the file is replaced during
+    the import.
+
+    Returns
+    -------
+    tuple
+        (digest, names_key)
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).digest()
+    with io.TextIOWrapper(open_bytes(data), encoding='utf-8') as filewg:
+        return digest, _parse_names(filewg)
+
+
+def write_names_text(input_path, lines):
+    """Writes the lines of a names database text file, compressed according
+    to its extension.
+
+    The lines are written in a temporary file first, which then replaces
+    the file, so that readers never see a partially written file.
+
+    Returns
+    -------
+    Path
+        The path of the temporary file, which has been renamed input_path.
+    """
+    input_path = Path(input_path)
+    temp_path = input_path.with_name(input_path.name + '.tmp%i' %
+                                     os.getpid())
+    with open_text(temp_path, 'w',
+                   compression=suffix_compression(input_path)) as f:
+        f.write('\n'.join(lines))
+    os.replace(temp_path, input_path)
+    return input_path
+
+
+sorted_names_text = namedtuple('sorted_names_text',
+                               ['digest', 'lines', 'names'])
+sorted_names_text.__doc__ = """Names database text file sorted by name,
+returned by read_sorted_names(): the sha256 digest of the file, its lines,
+and the name of each line."""
+
+
+def read_sorted_names(input_path):
+    """Reads a names database text file sorted by name, for missing_names()
+    and merge_names_out(), so that it is read and parsed only once. The
+    digest and the lines are computed from the same bytes.
+
+    Returns
+    -------
+    sorted_names_text
+        The digest, lines and names of the file.
+
+    Raises
+    ------
+    ValueError
+        If the lines of the file are not sorted by name.
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).digest()
+    with io.TextIOWrapper(open_bytes(data), encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    names = [line.rpartition('\t')[0] for line in lines]
+    if any(a >= b for a, b in zip(names, names[1:])):
+        raise ValueError(Path(input_path).name + ' is not sorted by name')
+    return sorted_names_text(digest, lines, names)
+
+
+def missing_names(names_text, names):
+    """Names of a list that are not in a names database text file sorted by
+    name, read by read_sorted_names()"""
+    present = set(names_text.names)
+    return [name for name in names if name not in present]
+
+
+def merge_names_out(input_path, names_genders, snapshot=True,
+                    names_text=None):
+    """Adds names to a names database text file sorted by name, and to its
+    snapshot, with a sorted merge.
+
+    The text file and the snapshot are written in temporary files and
+    renamed, so that wiki_gendersort never reads partially written files.
+    The new snapshot is made by inserting the new names in the arrays of the
+    current one, without parsing the text file into a dict. Both files are
+    still read and written in full, so the time is proportional to their
+    size, with a smaller constant than compile_snapshot().
+
+    Parameters
+    ----------
+    input_path: str or Path
+        Path to the NamesOut.txt file (possibly compressed), with its lines
+        sorted by name.
+
+    names_genders: dict
+        Gender of each name to add. The names that are already in the file
+        get the new gender.
+
+    snapshot: bool, optional
+        If True, the snapshot of the text file is updated if it exists.
+        When it is not up to date or some keys of the new names are
+        already in it, it is compiled again from the text file.
+        Default is True.
+
+    names_text: sorted_names_text, optional
+        The text file read by read_sorted_names(), if it was already read.
+        If None, it is read here. Default is None.
+
+    Returns
+    -------
+    int
+        Number of lines added or changed.
+
+    Raises
+    ------
+    ValueError
+        If the lines of the text file are not sorted by name.
+    """
+    input_path = Path(input_path)
+    if names_text is None:
+        names_text = read_sorted_names(input_path)
+    lines, names = names_text.lines, names_text.names
+    merged = []
+    changed = {}
+    start = 0
+    for name, gend in sorted(names_genders.items()):
+        i = bisect_left(names, name, start)
+        merged += lines[start:i]
+        line = name + '\t' + gend
+        merged.append(line)
+        if i < len(names) and names[i] == name:
+            start = i + 1
+            if lines[i] == line:
+                continue
+        else:
+            start = i
+        changed[name] = gend
+    if not changed:
+        return 0
+    merged += lines[start:]
+
+    snap_path = snapshot_path(input_path)
+    snap = None
+    if snapshot and snap_path.is_file():
+        # Checked against the current text file, before it is replaced
+        snap = load_snapshot(snap_path, digest=names_text.digest)
+    write_names_text(input_path, merged)
+    if snapshot and snap_path.is_file():
+        table = None
+        if snap is not None:
+            table = names_table.from_snapshot(snap).merged(
+                {name_key(name): gend for name, gend in changed.items()})
+        if table is None:
+            compile_snapshot(input_path, snap_path)
+        else:
+            write_snapshot(table, snap_path, source_hash(input_path))
+    return len(changed)
+
+
+def source_hash(input_path):
+    "Returns the sha256 digest of a file"
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def snapshot_path(input_path):
+    """Returns the default path of the snapshot of a names database
+    (NamesOut.snap for NamesOut.txt or NamesOut.txt.gz)"""
+    return strip_compression(input_path).with_suffix(SNAPSHOT_SUFFIX)
+
+
+def _pad(n):
+    "Number of bytes to add after n bytes to reach a multiple of 8"
+    return -n % 8
+
+
+def _pack(names_key):
+    """Converts a names_key dict into sorted arrays.
+
+    Returns the gender labels, the uint32 offsets of the keys in the key
+    blob, the uint8 gender codes and the key blob.
+    """
+    labels = list(GENDERS)
+    label_codes = {g: i for i, g in enumerate(labels)}
+    offsets = array('I', [0])
+    codes = array('B')
+    blob = bytearray()
+    for name in sorted(names_key):
+        gend = names_key[name]
+        if gend not in label_codes:
+            label_codes[gend] = len(labels)
+            labels.append(gend)
+        blob += name.encode('utf-8') + b'\n'
+        offsets.append(len(blob))
+        codes.append(label_codes[gend])
+    if len(labels) > 256 or offsets.itemsize != 4:
+        raise ValueError('Names database cannot be compiled into a snapshot')
+    return labels, offsets, codes, bytes(blob)
+
+
+def compile_snapshot(input_path, output_path=None, names_key=None,
+                     digest=None):
+    """Compiles a names database text file into a binary snapshot.
+
+    Parameters
+    ----------
+    input_path: str or Path
+        Path to the NamesOut.txt file.
+
+    output_path: str or Path, optional
+        Path of the snapshot. If None, the path will be input_path with
+        the .snap extension. Default is None.
+
+    names_key: dict, optional
+        The already imported content of input_path, to avoid parsing it
+        again. Default is None.
+
+    digest: bytes, optional
+        sha256 of the content of input_path names_key was imported from,
+        returned by read_names_source(). If None, input_path is hashed,
+        which can give the digest of a newer file if it was replaced since
+        names_key was imported. Default is None.
+
+    Returns
+    -------
+    Path
+        The path of the snapshot
+    """
+    input_path = Path(input_path)
+    if output_path is None:
+        output_path = snapshot_path(input_path)
+    output_path = Path(output_path)
+    if names_key is None:
+        digest, names_key = read_names_source(input_path)
+    elif digest is None:
+        digest = source_hash(input_path)
+
+    write_snapshot(names_key, output_path, digest)
+    return output_path
+
+
+def write_snapshot(names_key, output_path, digest=bytes(32)):
+    """Writes a names_key dict or names_table in a snapshot file.
+
+    The snapshot is written in a temporary file first, so that readers never
+    map a partially written snapshot.
+
+    Parameters
+    ----------
+    names_key: dict or names_table
+        The names database.
+
+    output_path: str or Path
+        Path of the snapshot.
+
+    digest: bytes, optional
+        sha256 of the text file the names database was imported from.
+        Default is zeros, for a names database not tied to a text file.
+    """
+    output_path = Path(output_path)
+    if isinstance(names_key, names_table):
+        labels, offsets, codes, blob = names_key.arrays()
+    else:
+        labels, offsets, codes, blob = _pack(names_key)
+    labels_data = json.dumps(labels).encode('utf-8')
+    header = _HEADER.pack(_MAGIC, SNAPSHOT_VERSION, sys.byteorder == 'little',
+                          len(codes), len(blob), len(labels_data), digest)
+    temp_path = output_path.with_name(output_path.name + '.tmp%i' %
+                                      os.getpid())
+    with open(temp_path, 'wb') as f:
+        for data in (header, labels_data, offsets, codes, blob):
+            f.write(data)
+            f.write(b'\x00' * _pad(memoryview(data).nbytes))
+    os.replace(temp_path, output_path)
+
+
+def publish_snapshot(names_key, path=None):
+    """Writes a names database in shared memory so that other processes
+    can memory-map it without copying or parsing it.
+
+    Parameters
+    ----------
+    names_key: dict or names_table
+        The names database.
+
+    path: str or Path, optional
+        Path of the published snapshot. If None, a new file is created in
+        /dev/shm (or in the temporary folder on systems without /dev/shm).
+        Default is None.
+
+    Returns
+    -------
+    Path
+        The path of the published snapshot, to give to
+        wiki_gendersort.attach()
+    """
+    if path is None:
+        shm_dir = Path('/dev/shm')
+        fd, path = tempfile.mkstemp(prefix='wiki_gendersort_',
+                                    suffix=SNAPSHOT_SUFFIX,
+                                    dir=shm_dir if shm_dir.is_dir() else None)
+        os.close(fd)
+    path = Path(path)
+    write_snapshot(names_key, path)
+    return path
+
+
+class names_snapshot():
+    """Memory-mapped content of a snapshot file.
+
+    Attributes
+    ----------
+    labels: list of str
+        The gender labels, indexed by gender code.
+
+    offsets: memoryview of uint32
+        offsets[i] is the position of the i-th key in blob.
+
+    codes: memoryview of uint8
+        codes[i] is the gender code of the i-th key.
+
+    blob: memoryview of bytes
+        The sorted keys encoded in utf-8, each followed by a line break.
+
+    digest: bytes
+        sha256 of the source file of the snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if len(buf) < _HEADER.size:
+            raise ValueError('Invalid snapshot file ' + self.path.name)
+        (magic, version, little, n, blob_len, labels_len,
+         self.digest) = _HEADER.unpack_from(buf)
+        if (magic != _MAGIC or version != SNAPSHOT_VERSION or
+                bool(little) != (sys.byteorder == 'little')):
+            raise ValueError('Invalid snapshot file ' + self.path.name)
+        pos = _HEADER.size + _pad(_HEADER.size)
+        self.labels = json.loads(bytes(buf[pos:pos+labels_len]))
+        pos += labels_len + _pad(labels_len)
+        self.offsets = buf[pos:pos+4*(n+1)].cast('I')
+        pos += 4*(n+1) + _pad(4*(n+1))
+        self.codes = buf[pos:pos+n]
+        pos += n + _pad(n)
+        self.blob = buf[pos:pos+blob_len]
+        self.blob_start = pos
+        if len(self.blob) != blob_len:
+            raise ValueError('Truncated snapshot file ' + self.path.name)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def keys(self):
+        "Returns the list of sorted keys"
+        return str(self.blob, 'utf-8').split('\n')[:-1]
+
+    def to_dict(self):
+        "Returns the content of the snapshot as a names_key dict"
+        return dict(zip(self.keys(), map(self.labels.__getitem__,
+                                         self.codes)))
+
+
+class names_table(Mapping):
+    """Read-only mapping of name tokens to genders stored in sorted arrays.
+
+    This is a drop-in replacement for the names_key dict of wiki_gendersort
+    which uses a few bytes per name instead of a few hundred. Lookups are
+    done by binary search on the utf-8 encoded keys, which is slower than a
+    dict but does not create any Python object per name. When built from a
+    snapshot, the arrays stay in the memory-mapped file and are shared by
+    all the processes using it.
+
+    Use names_table.from_dict() or names_table.from_snapshot() to create it.
+    """
+
+    def __init__(self, labels, offsets, codes, blob, blob_start=0):
+        self.labels = labels
+        self.offsets = offsets
+        self.codes = codes
+        # blob is sliced with absolute positions so that slicing a mmap
+        # directly returns bytes
+        self._blob = blob
+        self._start = blob_start
+
+    @classmethod
+    def from_dict(cls, names_key):
+        "Creates a names_table from a names_key dict"
+        return cls(*_pack(names_key))
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        "Creates a names_table from a names_snapshot, without copying it"
+        return cls(snap.labels, snap.offsets, snap.codes, snap._mmap,
+                   snap.blob_start)
+
+    def _key(self, i):
+        "Returns the i-th key encoded in utf-8"
+        return self._blob[self._start+self.offsets[i]:
+                          self._start+self.offsets[i+1]-1]
+
+    def arrays(self):
+        "Returns the labels, offsets, codes and key blob of the table"
+        return (self.labels, self.offsets, self.codes,
+                self._blob[self._start:self._start+self.offsets[-1]])
+
+    def _bisect(self, key, lo=0):
+        "Returns the position of the first key not below key (utf-8)"
+        hi = len(self.codes)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self._key(mid) < key:
+                lo = mid+1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, name):
+        "Returns the position of name in the table, or -1 if absent"
+        try:
+            key = name.encode('utf-8')
+        except (AttributeError, UnicodeEncodeError):
+            return -1
+        lo = self._bisect(key)
+        if lo != len(self.codes) and self._key(lo) == key:
+            return lo
+        return -1
+
+    def merged(self, names_key):
+        """Returns a new names_table with the names of a names_key dict
+        inserted, or None if some of them are already in the table.
+        The keys of the table are copied by blocks between the new names.
+        """
+        labels = list(self.labels)
+        label_codes = {g: i for i, g in enumerate(labels)}
+        offsets = array('I', [0])
+        codes = array('B')
+        blob = bytearray()
+        start = 0
+        previous = None
+        for key, gend in sorted((name.encode('utf-8'), gend)
+                                for name, gend in names_key.items()):
+            i = self._bisect(key, start)
+            if key == previous or (i < len(self.codes) and
+                                   self._key(i) == key):
+                return None
+            previous = key
+            self._copy_keys(start, i, offsets, codes, blob)
+            if gend not in label_codes:
+                label_codes[gend] = len(labels)
+                labels.append(gend)
+            blob += key + b'\n'
+            offsets.append(len(blob))
+            codes.append(label_codes[gend])
+            start = i
+        self._copy_keys(start, len(self.codes), offsets, codes, blob)
+        if len(labels) > 256 or len(blob) >= 2**32:
+            raise ValueError('Names database cannot be compiled into a '
+                             'snapshot')
+        return names_table(labels, offsets, codes, bytes(blob))
+
+    def _copy_keys(self, start, end, offsets, codes, blob):
+        "Appends the keys start to end of the table to the arrays"
+        if start == end:
+            return
+        shift = len(blob) - self.offsets[start]
+        blob += self._blob[self._start+self.offsets[start]:
+                           self._start+self.offsets[end]]
+        offsets.extend([offset + shift
+                        for offset in self.offsets[start+1:end+1]])
+        codes.frombytes(bytes(self.codes[start:end]))
+
+    def __getitem__(self, name):
+        i = self.find(name)
+        if i == -1:
+            raise KeyError(name)
+        return self.labels[self.codes[i]]
+
+    def __contains__(self, name):
+        return self.find(name) != -1
+
+    def get(self, name, default=None):
+        i = self.find(name)
+        if i == -1:
+            return default
+        return self.labels[self.codes[i]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        for i in range(len(self.codes)):
+            yield str(self._key(i), 'utf-8')
+
+    def values(self):
+        "Returns the list of genders, in the order of the sorted keys"
+        return [self.labels[c] for c in self.codes]
+
+    def items(self):
+        "Returns the list of (name, gender), sorted by name"
+        return list(zip(self, self.values()))
+
+    @property
+    def nbytes(self):
+        "Size of the arrays of the table, in bytes"
+        return (len(self.offsets)*4 + len(self.codes) +
+                self.offsets[len(self.codes)])
+
+
+def names_nbytes(names_key):
+    "Estimates the memory used by a names_key dict or names_table, in bytes"
+    if isinstance(names_key, names_table):
+        return names_key.nbytes
+    # The gender strings are shared by all the keys
+    return sys.getsizeof(names_key) + sum(map(sys.getsizeof, names_key))
+
+
+def source_signature(input_path):
+    """Returns a signature of the file of a names database that changes when
+    the file is modified, or None if the file does not exist"""
+    try:
+        st = os.stat(input_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def load_snapshot(path, input_path=None, digest=None):
+    """Opens a snapshot file.
+
+    Returns None if the snapshot does not exist, is invalid, or was not
+    compiled from the current content of input_path (if specified), or from
+    a source of sha256 digest (if specified).
+    """
+    if not Path(path).is_file():
+        return None
+    try:
+        snap = names_snapshot(path)
+    except (ValueError, OSError):
+        return None
+    if digest is None and input_path is not None:
+        digest = source_hash(input_path)
+    if digest is not None and snap.digest != digest:
+        return None
+    return snap
+
+
+def load_names_key(input_path, snapshot=True, verbose=False,
+                   backend='dict'):
+    """Imports the names database, using its snapshot if possible.
+
+    Parameters
+    ----------
+    input_path: str or Path
+        Path to the NamesOut.txt file (possibly compressed), or directly to
+        a .snap file.
+
+    snapshot: bool, optional
+        If True, the snapshot next to input_path is used when it is up to
+        date, and is (re)generated from the text file otherwise.
+        Default is True.
+
+    verbose: bool, optional
+        Prints which file is imported. Default is False.
+
+    backend: str, optional
+        'dict' returns a dict, and 'compact' returns a names_table, which
+        is memory-mapped from the snapshot when available.
+        Default is 'dict'.
+    """
+    if backend not in {'dict', 'compact'}:
+        raise ValueError('Unknown names database backend ' + repr(backend))
+    input_path = Path(input_path)
+    snap = None
+    if input_path.suffix == SNAPSHOT_SUFFIX:
+        snap = names_snapshot(input_path)
+    elif snapshot:
+        snap = load_snapshot(snapshot_path(input_path), input_path)
+    if snap is not None:
+        if verbose:
+            print('Importing names database from ' + snap.path.name)
+        if backend == 'compact':
+            return names_table.from_snapshot(snap)
+        return snap.to_dict()
+
+    if verbose:
+        print('Importing names database from ' + input_path.name)
+    digest, names_key = read_names_source(input_path)
+    if snapshot:
+        try:
+            compile_snapshot(input_path, names_key=names_key, digest=digest)
+        except OSError:
+            # Read-only location: the text file will be parsed every time
+            pass
+    if backend == 'compact':
+        return names_table.from_dict(names_key)
+    return names_key
+
+
+if __name__ == '__main__':
+    # compile_snapshot(Path(__file__).parent.absolute() / 'NamesOut.txt')
+    pass
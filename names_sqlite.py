@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+SQLite support of Wiki-Gendersort.
+
+export_sqlite() writes the names database as an indexed table of an SQLite
+database, and register_functions() adds the nameclean() and assign() SQL
+functions to an SQLite connection, so that genders can be assigned inside
+the database, for example:
+
+    import sqlite3
+    from names_sqlite import register_functions
+
+    connection = sqlite3.connect('authors.db')
+    register_functions(connection)
+    with connection:
+        connection.execute('UPDATE authors SET gender = assign(first_name)')
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def export_sqlite(db_path, input_path=None, table='names', names_key=None):
+    """Writes the names database in a table of an SQLite database, with the
+    names of NamesOut.txt, cased like name_key(), as primary key. The table
+    is replaced if it already exists.
+
+    Parameters
+    ----------
+    db_path: str or Path
+        Path of the SQLite database, created if needed.
+
+    input_path: str, optional
+        Path to the names database, like for wiki_gendersort().
+        Default is None.
+
+    table: str, optional
+        Name of the table, with the columns name and gender.
+        Default is 'names'.
+
+    names_key: dict or names_table, optional
+        Names database to export instead of importing input_path.
+        Default is None.
+
+    Returns
+    -------
+    int
+        Number of names written.
+    """
+    if names_key is None:
+        from Wiki_Gendersort import wiki_gendersort
+        names_key = wiki_gendersort(input_path).names_key
+    # The keys are inserted in the order of the index, which is the
+    # fastest for a WITHOUT ROWID table
+    rows = sorted(names_key.items())
+    quoted_table = '"' + table.replace('"', '""') + '"'
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:
+            connection.execute('DROP TABLE IF EXISTS ' + quoted_table)
+            connection.execute('CREATE TABLE ' + quoted_table +
+                               ' (name TEXT PRIMARY KEY NOT NULL,'
+                               ' gender TEXT NOT NULL) WITHOUT ROWID')
+            connection.executemany('INSERT INTO ' + quoted_table +
+                                   ' VALUES (?, ?)', rows)
+    finally:
+        connection.close()
+    print('%i names written in table %s of %s' %
+          (len(rows), table, Path(db_path).name))
+    return len(rows)
+
+
+def _create_function(connection, name, n_args, function):
+    "Registers a deterministic SQL function, if supported by SQLite"
+    try:
+        connection.create_function(name, n_args, function, deterministic=True)
+    except sqlite3.NotSupportedError:
+        connection.create_function(name, n_args, function)
+
+
+def register_functions(connection, WG=None):
+    """Registers SQL functions assigning genders on an SQLite connection:
+
+    assign(first_name)
+        Gender of a first name (M, F, UNI, UNK or INI), like
+        wiki_gendersort.assign().
+    matched_name(first_name)
+        Name token used to assign the gender, or NULL.
+    nameclean(first_name)
+        Name tokens of nameclean(), separated by spaces.
+
+    The functions are registered as deterministic, so that SQLite accepts
+    them in expression indexes and generated columns. However, assign()
+    and matched_name() depend on the names database of WG, which can
+    change with reload() or watch(), and SQLite does not update indexes or
+    stored columns built on them, so they should not be used there. The
+    functions return NULL for NULL.
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        The connection.
+
+    WG: wiki_gendersort, optional
+        The gender assigner. If None, a wiki_gendersort of the default names
+        database with a cache of 100000 results is imported.
+        Default is None.
+
+    Returns
+    -------
+    wiki_gendersort
+        The gender assigner used by the functions.
+    """
+    from Wiki_Gendersort import wiki_gendersort, nameclean
+
+    if WG is None:
+        WG = wiki_gendersort(result_cache_size=10**5)
+    lookup = WG.lookup
+
+    def sql_assign(name):
+        if name is None:
+            return None
+        return lookup(str(name)).gender
+
+    def sql_matched_name(name):
+        if name is None:
+            return None
+        return lookup(str(name)).matched_name
+
+    def sql_nameclean(name):
+        if name is None:
+            return None
+        return ' '.join(nameclean(str(name)))
+
+    _create_function(connection, 'assign', 1, sql_assign)
+    _create_function(connection, 'matched_name', 1, sql_matched_name)
+    _create_function(connection, 'nameclean', 1, sql_nameclean)
+    return WG
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 """
-Run this code to include the wiki-gendersort class in your Python environment
+Run this code to include the wiki-gendersort class in your Python environment,
+and to install the wiki-gendersort command
 """
 
 import os
 import site
+import stat
+import sys
+import sysconfig
 
 st_pkg = site.getsitepackages()[0]
 
@@ -19,3 +23,24 @@ with open(filepath, 'w') as FILE:
     for path in paths:
         FILE.write(path)
         FILE.write('\n')
+
+# Launcher of the command line interface in gendersort_cli.py
+scripts_path = sysconfig.get_path('scripts')
+launcher = f'''import sys
+sys.path.insert(0, {cwd!r})
+from gendersort_cli import main
+sys.exit(main())
+'''
+if os.name == 'nt':
+    filepath = os.path.join(scripts_path, 'wiki-gendersort-script.py')
+    with open(filepath, 'w') as FILE:
+        FILE.write(launcher)
+    with open(os.path.join(scripts_path, 'wiki-gendersort.cmd'), 'w') as FILE:
+        FILE.write(f'@"{sys.executable}" "{filepath}" %*\n')
+else:
+    filepath = os.path.join(scripts_path, 'wiki-gendersort')
+    with open(filepath, 'w') as FILE:
+        FILE.write(f'#!{sys.executable}\n')
+        FILE.write(launcher)
+    os.chmod(filepath, os.stat(filepath).st_mode |
+             stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
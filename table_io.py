@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Nicolas Berube, 2016-2020
+for Vincent Larivière, EBSI, University of Montreal
+
+Chunked reading and writing of CSV and Parquet tables for
+wiki_gendersort.table_assign().
+
+Tables are read and written as chunks, so that the memory used is bounded by
+the chunk size: dicts of column name to list of values for CSV files, and
+pyarrow RecordBatches for Parquet files, so that their column types are kept.
+The output table is created from the schema of the input table and the new
+columns (see table_schema() and add_fields()), before the first chunk.
+CSV files can be compressed (see compressed_io.py), and Parquet files need
+the pyarrow package.
+"""
+
+import csv
+from itertools import islice
+from pathlib import Path
+from compressed_io import open_text, strip_compression
+
+PARQUET_SUFFIXES = {'.parquet', '.pq'}
+
+
+def table_format(path):
+    "Returns 'parquet' or 'csv' from the extension of a path"
+    if strip_compression(path).suffix.lower() in PARQUET_SUFFIXES:
+        return 'parquet'
+    return 'csv'
+
+
+def _delimiter(path, delimiter):
+    "Tab for .tsv files, and comma for the others, if not specified"
+    if delimiter is not None:
+        return delimiter
+    if strip_compression(path).suffix.lower() == '.tsv':
+        return '\t'
+    return ','
+
+
+def _pyarrow_parquet():
+    "Imports the optional pyarrow package"
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('The pyarrow package is needed for Parquet files: '
+                          'pip install pyarrow')
+    return pq
+
+
+def table_schema(path, delimiter=None):
+    """Columns of a CSV or Parquet table.
+
+    Returns
+    -------
+    list or pyarrow.Schema
+        The column names of the header line of a CSV file, or the schema of
+        a Parquet file.
+    """
+    if table_format(path) == 'parquet':
+        return _pyarrow_parquet().read_schema(path)
+    with open_text(path, newline='') as f:
+        return next(csv.reader(f, delimiter=_delimiter(path, delimiter)), [])
+
+
+def schema_names(schema):
+    "Column names of a schema of table_schema()"
+    if isinstance(schema, list):
+        return schema
+    return schema.names
+
+
+def add_fields(schema, fields):
+    """Schema of table_schema() with new columns, given as a dict of column
+    name to type ('str' or 'int'), added at the end"""
+    if isinstance(schema, list):
+        return schema + list(fields)
+    import pyarrow as pa
+    types = {'str': pa.string(), 'int': pa.int8()}
+    for name, field_type in fields.items():
+        schema = schema.append(pa.field(name, types[field_type]))
+    return schema
+
+
+def read_chunks(path, chunksize, delimiter=None):
+    """Reads a CSV or Parquet table in chunks of chunksize rows.
+
+    Parameters
+    ----------
+    path: str or Path
+        Path of the table. Files with the extension .parquet or .pq are read
+        as Parquet, and the others as CSV with a header line.
+
+    chunksize: int
+        Number of rows of each chunk.
+
+    delimiter: str, optional
+        Delimiter of a CSV file. If None, it is a tab for .tsv files and a
+        comma otherwise. Default is None.
+
+    Yields
+    ------
+    dict or pyarrow.RecordBatch
+        Column name to list of values of the rows of the chunk for a CSV
+        file, and the RecordBatch of the rows for a Parquet file.
+    """
+    if table_format(path) == 'parquet':
+        pq = _pyarrow_parquet()
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunksize)
+        return
+
+    with open_text(path, newline='') as f:
+        reader = csv.reader(f, delimiter=_delimiter(path, delimiter))
+        columns = next(reader, [])
+        while True:
+            rows = list(islice(reader, chunksize))
+            if not rows:
+                break
+            # Short rows are completed with empty values
+            rows = [row + [''] * (len(columns) - len(row)) for row in rows]
+            yield dict(zip(columns, map(list, zip(*rows))))
+
+
+def chunk_column(chunk, column):
+    "List of the values of a column of a chunk"
+    if isinstance(chunk, dict):
+        return chunk[column]
+    return chunk.column(column).to_pylist()
+
+
+def add_columns(chunk, columns, schema):
+    """Chunk with new columns (dict of column name to list of values) added
+    at the end. schema is the schema of the output table, from add_fields(),
+    which gives the types of the new columns of a RecordBatch."""
+    if isinstance(chunk, dict):
+        chunk = dict(chunk)
+        chunk.update(columns)
+        return chunk
+    import pyarrow as pa
+    arrays = chunk.columns + [pa.array(values, schema.field(name).type)
+                              for name, values in columns.items()]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class chunk_writer():
+    """Writes chunks of rows in a CSV or Parquet table, depending on the
+    extension of path. The table is created with the columns of schema
+    (see add_fields()) when the writer is created, so that a table without
+    rows is written too.
+
+    Use as a context manager, or call close() at the end.
+    """
+
+    def __init__(self, path, schema, delimiter=None):
+        self.path = Path(path)
+        self.format = table_format(path)
+        self._file = None
+        if self.format == 'parquet':
+            import pyarrow as pa
+            if isinstance(schema, list):
+                schema = pa.schema([(name, pa.string()) for name in schema])
+            self._writer = _pyarrow_parquet().ParquetWriter(self.path, schema)
+        else:
+            self._file = open_text(self.path, 'w', newline='')
+            self._writer = csv.writer(self._file,
+                                      delimiter=_delimiter(path, delimiter))
+            self._writer.writerow(schema_names(schema))
+
+    def write(self, chunk):
+        "Writes a chunk of rows, with the columns of the schema"
+        if self.format == 'parquet':
+            import pyarrow as pa
+            if isinstance(chunk, dict):
+                chunk = pa.RecordBatch.from_pydict(chunk,
+                                                   schema=self._writer.schema)
+            self._writer.write_batch(chunk)
+            return
+        if not isinstance(chunk, dict):
+            chunk = chunk.to_pydict()
+        self._writer.writerows(zip(*chunk.values()))
+
+    def close(self):
+        if self._writer is not None and self.format == 'parquet':
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
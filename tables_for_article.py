@@ -15,6 +15,7 @@ based on the specific datasets raw files.
 
 from pathlib import Path
 from Wiki_Gendersort import wiki_gendersort, nameclean
+from log_reader import read_log
 from tqdm import tqdm
 from time import sleep
 # from collections import Counter
@@ -253,21 +254,13 @@ def table_compare(sort_path):
     # Imports log file data for gender assignation method
     log_path = cwd / 'NamesLog.txt'
     name_method = {}
-    with open(log_path) as f:
-        datalogtemp = f.read()
-    datalogtemp = datalogtemp.split('\n\n')
-    for d in datalogtemp:
-        if len(d) != 0:
-            ds = d.split('\n')
-            if len(ds) >= 2:
-                name = ds[0]
-                gend = ds[-1].replace(' ', '').split('=')[-1]
-                method = 1
-                if '2' in ds:
-                    method = 2
-                if gend == 'UNK':
-                    method = 0
-                name_method[name] = method
+    for name, gend, time, d in read_log(log_path).values():
+        method = 1
+        if '2' in d.split('\n'):
+            method = 2
+        if gend == 'UNK':
+            method = 0
+        name_method[name] = method
 
     print('Processing comparative data tables')
     default_names = []